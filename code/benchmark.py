@@ -0,0 +1,261 @@
+'''
+  Benchmark suite for every registered backend.
+
+  Each (engine, thread count) pair runs in a fresh subprocess - under mpirun for MPI - so thread pools, JIT caches and
+  process pools never leak from one measurement into the next. Inside it every case gets a warm-up phase (JIT
+  compilation, pool start-up; timed separately as warmupSeconds) and then a measured phase of --runs calls, reported as
+  median, min and IQR. Work is reported as Mpixel/s and as Mpixel-iterations/s, where the iterations are the ones the
+  pixels actually ran (escape count + 1, or maxIterations inside the set; engines.frameWork), so a full-set view and a
+  deep zoom compare fairly.
+
+  Sweeps resolution, maxIterations, thread count (parallel engines only) and viewport:
+    python benchmark.py run --engines numba_better,numba_betterer --sizes 500,1000 --iterations 80,1000 --threads 1,2,4 --out new.json --csv new.csv
+  Flags medians that got slower by more than --threshold and by more than the runs' own spread (IQR):
+    python benchmark.py compare old.json new.json --threshold 0.05
+  Time to first pixel of a fresh process, with an empty and then a warm Numba on-disk cache (NUMBA_CACHE_DIR):
+    python benchmark.py startup --engines numba_better,numba_betterer,numba_aot
+'''
+
+import argparse, csv, datetime, importlib.util, itertools, json, os, platform, shlex, shutil, subprocess, sys, tempfile, time
+import numpy as np
+import engines
+
+_SKIP = {'cached'}  # Would only measure cache hits
+
+_VIEWS = {
+  'full': (-2.0, 0.5, -1.2, 1.2),                        # main.py's default view
+  'zoom': (-0.74877, -0.74872, 0.06505, 0.06510),        # main.py's commented-out deep zoom
+}
+_WARMUP    = 2
+_RUNS      = 7
+_THRESHOLD = 0.05   # compare: relative slowdown of the median that counts as a regression
+_STARTUP_FRAME = (-2.0, 0.5, -1.2, 1.2, 64, 64, 80)    # Small: startup is about imports and compilation, not pixels
+_FIELDS    = ['engine', 'view', 'width', 'height', 'maxIterations', 'threads', 'runs', 'warmupSeconds',
+              'median', 'min', 'iqr', 'mpixelsPerSecond', 'mpixelIterationsPerSecond']
+
+def available():
+  '''Engines that load here; 'mpi' is only checked for, it is imported inside its own mpirun subprocess.'''
+  names = [name for name in engines.names() if name not in _SKIP and name != 'mpi' and engines.load(name)]
+  if importlib.util.find_spec('mpi4py') is not None:
+    names.append('mpi')
+  return names
+
+def summarize(times):
+  q1, median, q3 = np.percentile(times, [25, 50, 75])
+  return {'median': float(median), 'min': float(min(times)), 'iqr': float(q3 - q1)}
+
+##############################
+# Inside the measuring process
+##############################
+def measure(engineName, threads, cases, warmup, runs):
+  engine = engines.get(engineName)
+  if engineName == 'mpi':
+    from mpi4py import MPI
+    import mandelbrot7_mpi
+    comm = MPI.COMM_WORLD
+    def func(*args):                                     # Collective: time from the first rank in to the last rank out
+      comm.Barrier()
+      result = mandelbrot7_mpi.mandelbrot_set_mpi(*args)
+      comm.Barrier()
+      return result
+    leader = comm.Get_rank() == 0
+  else:
+    if engineName == 'multiprocessing':
+      import mandelbrot6_multiprocessing
+      mandelbrot6_multiprocessing.getPool(threads)
+    func = engine.func
+    leader = True
+
+  records = []
+  for viewName, width, height, maxIterations in cases:
+    args = _VIEWS[viewName] + (width, height, maxIterations)
+    start = time.perf_counter()
+    for _ in range(warmup):
+      result = func(*args)
+    warmupSeconds = time.perf_counter() - start
+    times = []
+    for _ in range(runs):
+      start = time.perf_counter()
+      result = func(*args)
+      times.append(time.perf_counter() - start)
+    if not leader:
+      continue
+    record = {'engine': engineName, 'view': viewName, 'width': width, 'height': height, 'maxIterations': maxIterations,
+              'threads': threads, 'runs': runs, 'warmupSeconds': warmupSeconds}
+    record.update(summarize(times))
+    record['mpixelsPerSecond'] = width * height / record['median'] / 1e6
+    record['mpixelIterationsPerSecond'] = engines.frameWork(engine, result, maxIterations)[2] / record['median'] / 1e6
+    records.append(record)
+  if leader:
+    print(json.dumps(records))
+
+def firstPixel(engineName, launched):
+  '''Inside a fresh process: seconds from launch to importing the engine, and to its first frame.'''
+  imported = time.time()
+  func = engines.get(engineName).func
+  loaded = time.time()
+  func(*_STARTUP_FRAME)
+  done = time.time()
+  print(json.dumps({'interpreter': imported - launched, 'import': loaded - imported, 'firstCall': done - loaded, 'firstPixel': done - launched}))
+
+##############################
+# Driving the subprocesses
+##############################
+def launch(engineName, threads, cases, warmup, runs, mpirun):
+  env = dict(os.environ)
+  for variable in ('NUMBA_NUM_THREADS', 'OMP_NUM_THREADS', 'NUMEXPR_NUM_THREADS', 'NUMEXPR_MAX_THREADS'):
+    env[variable] = str(threads)
+  command = [sys.executable, os.path.abspath(__file__), 'measure', '--engine', engineName, '--threads', str(threads),
+             '--warmup', str(warmup), '--runs', str(runs), '--cases', json.dumps(cases)]
+  if engineName == 'mpi':
+    env['NUMBA_NUM_THREADS'] = env['OMP_NUM_THREADS'] = '1'   # One core per rank; the ranks are the threads
+    command = shlex.split(mpirun) + ['-n', str(threads)] + command
+  process = subprocess.run(command, env = env, capture_output = True, text = True, cwd = os.path.dirname(os.path.abspath(__file__)))
+  if process.returncode != 0:
+    print('  ' + engineName + ' x' + str(threads) + ' failed: ' + (process.stderr.strip().splitlines() or ['?'])[-1], file = sys.stderr)
+    return []
+  return json.loads(process.stdout.strip().splitlines()[-1])
+
+def machine():
+  import numba
+  return {'date': datetime.datetime.now().isoformat(timespec = 'seconds'), 'platform': platform.platform(),
+          'processor': platform.processor(), 'cpus': os.cpu_count(), 'python': platform.python_version(),
+          'numpy': np.__version__, 'numba': numba.__version__}
+
+def run(args):
+  names = available()
+  engineNames = args.engines.split(',') if args.engines else names
+  for name in engineNames:
+    if name not in names:
+      raise KeyError('No engine available as ' + repr(name) + ', choose from ' + ', '.join(names))
+  if 'mpi' in engineNames and shutil.which(shlex.split(args.mpirun)[0]) is None:
+    print('  mpi skipped: ' + args.mpirun + ' not found', file = sys.stderr)
+    engineNames.remove('mpi')
+
+  cases = [(view, size, size, maxIterations) for view, size, maxIterations
+           in itertools.product(args.views.split(','), map(int, args.sizes.split(',')), map(int, args.iterations.split(',')))]
+  threadCounts = [int(t) for t in args.threads.split(',')]
+  results = []
+  for name in engineNames:
+    parallel = name == 'mpi' or engines.get(name).parallel
+    for threads in (threadCounts if parallel else [1]):
+      for record in launch(name, threads, cases, args.warmup, args.runs, args.mpirun):
+        results.append(record)
+        print('  %-16s %-5s %5dx%-5d %6d it  x%-3d median %.4fs  min %.4fs  iqr %.4fs  %8.1f Mpixel-it/s'
+              % (record['engine'], record['view'], record['width'], record['height'], record['maxIterations'],
+                 record['threads'], record['median'], record['min'], record['iqr'], record['mpixelIterationsPerSecond']))
+
+  if args.out:
+    with open(args.out, 'w') as file:
+      json.dump({'machine': machine(), 'results': results}, file, indent = 2)
+  if args.csv:
+    with open(args.csv, 'w', newline = '') as file:
+      writer = csv.DictWriter(file, _FIELDS)
+      writer.writeheader()
+      writer.writerows(results)
+  return results
+
+def startup(engineNames, repeats):
+  '''Time to first pixel per engine, cold (empty Numba cache) and warm (cache filled by the cold run); best of repeats.'''
+  here = os.path.dirname(os.path.abspath(__file__))
+  results = []
+  for name in engineNames:
+    with tempfile.TemporaryDirectory() as cacheDir:
+      env = dict(os.environ, NUMBA_CACHE_DIR = cacheDir)
+      for state in ('cold', 'warm'):
+        best = None
+        for _ in range(repeats if state == 'warm' else 1):       # Only the very first run is really cold
+          process = subprocess.run([sys.executable, os.path.abspath(__file__), 'first-pixel', '--engine', name, '--launched', repr(time.time())],
+                                   env = env, capture_output = True, text = True, cwd = here)
+          if process.returncode != 0:
+            print('  ' + name + ' failed: ' + (process.stderr.strip().splitlines() or ['?'])[-1], file = sys.stderr)
+            break
+          record = json.loads(process.stdout.strip().splitlines()[-1])
+          best = record if best is None or record['firstPixel'] < best['firstPixel'] else best
+        if best is None:
+          break
+        best.update(engine = name, cache = state)
+        results.append(best)
+        print('  %-16s %-4s first pixel %.3fs  (interpreter %.3fs, import %.3fs, first call %.3fs)'
+              % (name, state, best['firstPixel'], best['interpreter'], best['import'], best['firstCall']))
+  return results
+
+def _key(record):
+  return (record['engine'], record['view'], record['width'], record['height'], record['maxIterations'], record['threads'])
+
+def compare(oldPath, newPath, threshold = _THRESHOLD):
+  '''Prints every case in both files; returns the regressions (slower by > threshold and by more than the noise).'''
+  with open(oldPath) as file:
+    old = {_key(r): r for r in json.load(file)['results']}
+  with open(newPath) as file:
+    new = {_key(r): r for r in json.load(file)['results']}
+  regressions = []
+  for key in sorted(old.keys() & new.keys()):
+    before, after = old[key], new[key]
+    change = after['median'] / before['median'] - 1
+    noise = max(before['iqr'], after['iqr'])
+    regressed = change > threshold and after['median'] - before['median'] > noise
+    improved = change < -threshold and before['median'] - after['median'] > noise
+    if regressed:
+      regressions.append(key)
+    print('  %-16s %-5s %5dx%-5d %6d it  x%-3d %.4fs -> %.4fs  %+6.1f%%  %s'
+          % (key + (before['median'], after['median'], change * 100, 'REGRESSION' if regressed else 'faster' if improved else '')))
+  for key in sorted(old.keys() ^ new.keys()):
+    print('  only in ' + (oldPath if key in old else newPath) + ': ' + ' '.join(map(str, key)))
+  return regressions
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description = 'Benchmark the registered Mandelbrot backends')
+  commands = parser.add_subparsers(dest = 'command', required = True)
+
+  runParser = commands.add_parser('run', help = 'sweep engines x views x sizes x iterations x threads')
+  runParser.add_argument('--engines',    default = '',           help = 'comma separated, default every available engine')
+  runParser.add_argument('--views',      default = 'full,zoom',  help = 'from: ' + ', '.join(_VIEWS))
+  runParser.add_argument('--sizes',      default = '500,1000',   help = 'square frame sizes in pixels')
+  runParser.add_argument('--iterations', default = '80,1000')
+  runParser.add_argument('--threads',    default = str(os.cpu_count()), help = 'thread / process / rank counts for parallel engines')
+  runParser.add_argument('--warmup',     type = int, default = _WARMUP)
+  runParser.add_argument('--runs',       type = int, default = _RUNS)
+  runParser.add_argument('--mpirun',     default = 'mpirun',     help = 'launcher, e.g. "mpirun --oversubscribe"')
+  runParser.add_argument('--out',        help = 'JSON results file')
+  runParser.add_argument('--csv',        help = 'CSV results file')
+
+  compareParser = commands.add_parser('compare', help = 'flag regressions between two JSON results files')
+  compareParser.add_argument('old')
+  compareParser.add_argument('new')
+  compareParser.add_argument('--threshold', type = float, default = _THRESHOLD)
+
+  startupParser = commands.add_parser('startup', help = 'time to first pixel of a fresh process, cold and warm JIT cache')
+  startupParser.add_argument('--engines', default = 'numba,numba_better,numba_betterer,numba_aot,cython')
+  startupParser.add_argument('--repeats', type = int, default = 3)
+  startupParser.add_argument('--out',     help = 'JSON results file')
+
+  firstPixelParser = commands.add_parser('first-pixel', help = argparse.SUPPRESS)  # Internal: one fresh process
+  firstPixelParser.add_argument('--engine')
+  firstPixelParser.add_argument('--launched', type = float)
+
+  measureParser = commands.add_parser('measure', help = argparse.SUPPRESS)   # Internal: one engine, in its own process
+  measureParser.add_argument('--engine')
+  measureParser.add_argument('--threads', type = int)
+  measureParser.add_argument('--warmup',  type = int)
+  measureParser.add_argument('--runs',    type = int)
+  measureParser.add_argument('--cases')
+
+  args = parser.parse_args()
+  if args.command == 'run':
+    run(args)
+  elif args.command == 'startup':
+    names = args.engines.split(',')
+    for name in names:
+      if not engines.load(name):
+        print('  ' + name + ' unavailable: ' + engines.unavailable()[name])
+    results = startup([name for name in names if engines.load(name)], args.repeats)
+    if args.out:
+      with open(args.out, 'w') as file:
+        json.dump({'machine': machine(), 'results': results}, file, indent = 2)
+  elif args.command == 'first-pixel':
+    firstPixel(args.engine, args.launched)
+  elif args.command == 'compare':
+    sys.exit(1 if compare(args.old, args.new, args.threshold) else 0)
+  else:
+    measure(args.engine, args.threads, [tuple(case) for case in json.loads(args.cases)], args.warmup, args.runs)
@@ -0,0 +1,42 @@
+'''
+  Throughput cost of the precision= and output= modes.
+
+  Times every backend that supports them in float32/float64 and counts/smooth, and prints megapixels per second
+  relative to that backend's own float32 counts run.
+
+    python benchmark_modes.py
+'''
+
+import time, engines
+
+_ENGINES = ['numpy_compact', 'numba_betterer', 'cython']  # The ones with precision= / output= (cython only if c_mandelbrot is built)
+
+_VIEWS = {
+  'Full set:':  (-2.0, 0.5, -1.2, 1.2, 1000, 1000, 80),
+  'Deep zoom:': (-0.74877, -0.74872, 0.06505, 0.06510, 500, 500, 2048),
+}
+_RUNS = 5
+
+def bestTime(func, args, kwargs):
+  func(*args[:4], 16, 16, args[6], **kwargs)  # JIT warm-up, not timed
+  times = []
+  for _ in range(_RUNS):
+    start = time.perf_counter()
+    func(*args, **kwargs)
+    times.append(time.perf_counter() - start)
+  return min(times)
+
+if __name__ == '__main__':
+  for viewName, view in _VIEWS.items():
+    print(viewName, view[4], 'x', view[5], ':', view[6], 'iterations')
+    for name in _ENGINES:
+      if not engines.load(name):
+        continue
+      engine = engines.get(name)
+      baseline = None
+      for precision in engine.precisions:
+        for output in engine.outputs:
+          seconds = bestTime(engine.func, view, {'precision': precision, 'output': output})
+          baseline = baseline or seconds
+          megapixels = view[4] * view[5] / seconds / 1e6
+          print('  ' + name + '\t' + precision.name + '\t' + output + '\t' + '%.1f' % megapixels + ' Mpixel/s\t' + '%.2f' % (seconds / baseline) + 'x time')
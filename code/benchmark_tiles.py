@@ -0,0 +1,97 @@
+'''
+  Load generator for mandelbrot_tile_server.py, all on localhost.
+
+  At each concurrency level N, N keep-alive connections fetch --requests random tiles between them as fast as the
+  server answers. Reports tiles per second, p50/p99 latency, and how many requests the server coalesced or cancelled
+  (its /stats, before and after). Tiles are drawn from a small pool (--distinct) so concurrent duplicates happen.
+
+    python benchmark_tiles.py --spawn --workers 4 --concurrency 1,4,16,64
+  or against a server that is already running:
+    python benchmark_tiles.py --port 8000
+'''
+
+import argparse, asyncio, json, os, random, subprocess, sys, time, numpy as np
+from mandelbrot_tile_server import _WORLD
+
+async def _get(reader, writer, path):
+  writer.write(('GET ' + path + ' HTTP/1.1\r\nHost: localhost\r\n\r\n').encode())
+  await writer.drain()
+  head = await reader.readuntil(b'\r\n\r\n')
+  length = int(next(line.split(b':')[1] for line in head.split(b'\r\n') if line.lower().startswith(b'content-length')))
+  body = await reader.readexactly(length)
+  if not head.startswith(b'HTTP/1.1 200'):
+    raise RuntimeError(path + ': ' + head.split(b'\r\n', 1)[0].decode())
+  return body
+
+async def stats(host, port):
+  reader, writer = await asyncio.open_connection(host, port)
+  try:
+    return json.loads(await _get(reader, writer, '/stats'))
+  finally:
+    writer.close()
+
+async def load(host, port, paths, concurrency):
+  '''Returns (latencies in seconds, wall seconds) for fetching every path over `concurrency` connections.'''
+  queue = list(reversed(paths))
+  latencies = []
+  async def client():
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+      while queue:
+        path = queue.pop()
+        start = time.perf_counter()
+        await _get(reader, writer, path)
+        latencies.append(time.perf_counter() - start)
+    finally:
+      writer.close()
+  start = time.perf_counter()
+  await asyncio.gather(*(client() for _ in range(concurrency)))
+  return latencies, time.perf_counter() - start
+
+def tilePaths(count, distinct, minZoom, maxZoom, seed):
+  rng = random.Random(seed)
+  pool = []
+  for _ in range(distinct):
+    z = rng.randint(minZoom, maxZoom)
+    # Near the boundary of the set, where tiles are interesting (and expensive): around -0.75 + 0.1i
+    x = min(2 ** z - 1, int((-0.75 - _WORLD[0] + rng.uniform(-0.6, 0.6)) / (_WORLD[1] - _WORLD[0]) * 2 ** z))
+    y = min(2 ** z - 1, int((_WORLD[3] - 0.1 + rng.uniform(-0.6, 0.6)) / (_WORLD[3] - _WORLD[2]) * 2 ** z))   # y counts down from the top
+    pool.append('/' + str(z) + '/' + str(x) + '/' + str(y) + '.png')
+  return [rng.choice(pool) for _ in range(count)]
+
+async def main(args):
+  for level in map(int, args.concurrency.split(',')):
+    before = await stats(args.host, args.port)
+    latencies, seconds = await load(args.host, args.port, tilePaths(args.requests, args.distinct, args.min_zoom, args.max_zoom, args.seed + level), level)
+    after = await stats(args.host, args.port)
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+    print('  concurrency %3d  %6.1f tiles/s  p50 %7.1f ms  p99 %7.1f ms  computed %4d  coalesced %4d  cancelled %3d'
+          % (level, len(latencies) / seconds, p50, p99, *(after.get(k, 0) - before.get(k, 0) for k in ('computed', 'coalesced', 'cancelled'))))
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description = 'Load test the Mandelbrot tile server')
+  parser.add_argument('--host',        default = '127.0.0.1')
+  parser.add_argument('--port',        type = int, default = 8000)
+  parser.add_argument('--spawn',       action = 'store_true', help = 'start mandelbrot_tile_server.py first (and stop it after)')
+  parser.add_argument('--workers',     type = int, default = os.cpu_count(), help = 'with --spawn')
+  parser.add_argument('--pool',        choices = ['thread', 'process'], default = 'thread', help = 'with --spawn')
+  parser.add_argument('--concurrency', default = '1,4,16,64')
+  parser.add_argument('--requests',    type = int, default = 200, help = 'per concurrency level')
+  parser.add_argument('--distinct',    type = int, default = 100, help = 'size of the pool tiles are drawn from')
+  parser.add_argument('--min-zoom',    type = int, default = 2)
+  parser.add_argument('--max-zoom',    type = int, default = 8)
+  parser.add_argument('--seed',        type = int, default = 0)
+  args = parser.parse_args()
+
+  server = None
+  if args.spawn:
+    here = os.path.dirname(os.path.abspath(__file__))
+    server = subprocess.Popen([sys.executable, os.path.join(here, 'mandelbrot_tile_server.py'), '--host', args.host, '--port', str(args.port),
+                               '--workers', str(args.workers), '--pool', args.pool], cwd = here, stdout = subprocess.PIPE, text = True)
+    print(server.stdout.readline().strip())      # Printed once the pool is warm and the socket is listening
+  try:
+    asyncio.run(main(args))
+  finally:
+    if server is not None:
+      server.terminate()
+      server.wait()
@@ -0,0 +1,24 @@
+'''
+  Ahead-of-time build of the mandelbrot_aot extension module used by mandelbrot3b_numba_aot.py.
+
+    python build_aot.py
+'''
+
+import os
+from numba.pycc import CC
+from mandelbrot3a_numba_better import mandelbrot_numba_better
+
+cc = CC('mandelbrot_aot')
+cc.output_dir = os.path.dirname(os.path.abspath(__file__))
+
+# Same loop as mandelbrot_numba_better_rows, frozen for float64 coordinates and a C-contiguous int32 output
+@cc.export('mandelbrot_aot_rows', 'void(f8, f8, f8, f8, i8, i8, i4[:, ::1])')
+def mandelbrot_aot_rows(xMin, xStep, yMin, yStep, row0, maxIterations, output):
+  for j in range(output.shape[0]):
+    cImag = yMin + (row0 + j) * yStep
+    for i in range(output.shape[1]):
+      output[j, i] = mandelbrot_numba_better(xMin + i * xStep, cImag, maxIterations)
+
+if __name__ == '__main__':
+  cc.compile()
+  print('Built', cc.output_file, 'in', cc.output_dir)
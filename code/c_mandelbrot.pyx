@@ -1,36 +1,198 @@
+# Typed memoryviews, nogil kernels and OpenMP prange over rows; see setup.py for the -fopenmp / -O3 -march=native build
+# Built without OpenMP, prange simply runs serially, so the results are identical either way
 import cython
 import numpy as np
+from cython cimport floating              # float or double; every kernel below is compiled for both
+from cython.parallel cimport prange
+from libc.math cimport log, log2
 
-cdef int mandelbrot_cython_func(double cReal, double cImaginary, int maxIterations):
-  cdef double real = cReal
-  cdef double imaginary = cImaginary
-  cdef double real2
-  cdef double imaginary2
+cdef double SMOOTH_BAILOUT = 256.0 * 256.0  # Same as engines.SMOOTH_BAILOUT
+
+# Thread id and wall clock for the per-row timings (instrument.py); a build without OpenMP is one thread, where
+# process CPU time is as good as wall time
+cdef extern from *:
+  """
+  #ifdef _OPENMP
+  #include <omp.h>
+  static int mandelbrot_thread(void) { return omp_get_thread_num(); }
+  static double mandelbrot_now(void) { return omp_get_wtime(); }
+  #else
+  #include <time.h>
+  static int mandelbrot_thread(void) { return 0; }
+  static double mandelbrot_now(void) { return (double)clock() / CLOCKS_PER_SEC; }
+  #endif
+  """
+  int mandelbrot_thread() noexcept nogil
+  double mandelbrot_now() noexcept nogil
+
+cdef int mandelbrot_cython_func(floating cReal, floating cImaginary, int maxIterations) noexcept nogil:
+  cdef floating real = cReal
+  cdef floating imaginary = cImaginary
+  cdef floating real2
+  cdef floating imaginary2
   cdef int n
-    
+
   for n in range(maxIterations):
     real2 = real * real
     imaginary2 = imaginary * imaginary
-    if real2 + imaginary2 > 4.0:
+    if real2 + imaginary2 > <floating>4.0:  # Cast so float stays float (no promotion to double every iteration)
       return n
     imaginary = 2 * real * imaginary + cImaginary
     real = real2 - imaginary2 + cReal;
   return 0
 
+# Opt-in fast path: closed-form main cardioid / period-2 bulb test, then a Brent-style exact cycle check
+cdef int mandelbrot_cython_func_fast(floating cReal, floating cImaginary, int maxIterations) noexcept nogil:
+  cdef double xQuarter = <double>cReal - 0.25   # Closed-form tests in double so rounding can't flip a border pixel
+  cdef double q = xQuarter * xQuarter + <double>cImaginary * cImaginary
+  cdef floating real = cReal
+  cdef floating imaginary = cImaginary
+  cdef floating real2
+  cdef floating imaginary2
+  cdef floating oldReal = real
+  cdef floating oldImaginary = imaginary
+  cdef int steps = 0
+  cdef int window = 8
+  cdef int n
+
+  if q * (q + xQuarter) <= 0.25 * cImaginary * cImaginary:
+    return 0
+  if (cReal + 1.0) * (cReal + 1.0) + cImaginary * cImaginary <= 0.0625:
+    return 0
+  for n in range(maxIterations):
+    real2 = real * real
+    imaginary2 = imaginary * imaginary
+    if real2 + imaginary2 > <floating>4.0:  # Cast so float stays float (no promotion to double every iteration)
+      return n
+    imaginary = 2 * real * imaginary + cImaginary
+    real = real2 - imaginary2 + cReal
+    if real == oldReal and imaginary == oldImaginary:
+      return 0
+    steps += 1
+    if steps == window:
+      steps = 0
+      window *= 2
+      oldReal = real
+      oldImaginary = imaginary
+  return 0
+
+# Smooth (continuous) escape time: n + 1 - log2(log|z|), 0.0 for points that never escape
+cdef double mandelbrot_cython_func_smooth(floating cReal, floating cImaginary, int maxIterations) noexcept nogil:
+  cdef floating real = 0
+  cdef floating imaginary = 0
+  cdef floating real2
+  cdef floating magnitude
+  cdef int n
+
+  for n in range(maxIterations):
+    real2 = real * real - imaginary * imaginary + cReal
+    imaginary = 2 * real * imaginary + cImaginary
+    real = real2
+    magnitude = real * real + imaginary * imaginary
+    if magnitude > SMOOTH_BAILOUT:
+      return n + 1 - log2(0.5 * log(magnitude))
+  return 0
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef inline void mandelbrot_cython_row(floating[::1] realNums, floating cImaginary, int[::1] row, int maxIterations, bint fast, double* time) noexcept nogil:
+  cdef Py_ssize_t i
+  if time != NULL:                          # Instrumented: (thread, start, end) of this row
+    time[0] = mandelbrot_thread()
+    time[1] = mandelbrot_now()
+  for i in range(realNums.shape[0]):
+    if fast:
+      row[i] = mandelbrot_cython_func_fast(realNums[i], cImaginary, maxIterations)
+    else:
+      row[i] = mandelbrot_cython_func(realNums[i], cImaginary, maxIterations)
+  if time != NULL:
+    time[2] = mandelbrot_now()
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef inline void mandelbrot_cython_row_smooth(floating[::1] realNums, floating cImaginary, floating[::1] row, int maxIterations, double* time) noexcept nogil:
+  cdef Py_ssize_t i
+  if time != NULL:
+    time[0] = mandelbrot_thread()
+    time[1] = mandelbrot_now()
+  for i in range(realNums.shape[0]):
+    row[i] = <floating>mandelbrot_cython_func_smooth(realNums[i], cImaginary, maxIterations)
+  if time != NULL:
+    time[2] = mandelbrot_now()
+
+# Rows through the cardioid cost maxIterations per pixel, rows near the edge a few, hence the dynamic schedule
+# threads <= 0 leaves the thread count to OpenMP (OMP_NUM_THREADS, else every core)
+# times: NULL, or 3 doubles per row for (thread, start, end)
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef void mandelbrot_cython_counts(floating[::1] realNums, floating[::1] imagNums, int[:, ::1] escapeCounts, int maxIterations, bint fast, int threads, double* times) noexcept nogil:
+  cdef Py_ssize_t j
+  if threads > 0:
+    for j in prange(imagNums.shape[0], schedule = 'dynamic', num_threads = threads):
+      mandelbrot_cython_row(realNums, imagNums[j], escapeCounts[j], maxIterations, fast, times + 3 * j if times != NULL else NULL)
+  else:
+    for j in prange(imagNums.shape[0], schedule = 'dynamic'):
+      mandelbrot_cython_row(realNums, imagNums[j], escapeCounts[j], maxIterations, fast, times + 3 * j if times != NULL else NULL)
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef void mandelbrot_cython_smooth(floating[::1] realNums, floating[::1] imagNums, floating[:, ::1] escapeCounts, int maxIterations, int threads, double* times) noexcept nogil:
+  cdef Py_ssize_t j
+  if threads > 0:
+    for j in prange(imagNums.shape[0], schedule = 'dynamic', num_threads = threads):
+      mandelbrot_cython_row_smooth(realNums, imagNums[j], escapeCounts[j], maxIterations, times + 3 * j if times != NULL else NULL)
+  else:
+    for j in prange(imagNums.shape[0], schedule = 'dynamic'):
+      mandelbrot_cython_row_smooth(realNums, imagNums[j], escapeCounts[j], maxIterations, times + 3 * j if times != NULL else NULL)
+
 @cython.cdivision(True)
 @cython.nonecheck(False)
 @cython.boundscheck(False)
 @cython.wraparound(False)
-cpdef mandelbrot_set_cython_func(double xMin, double xMax, double yMin, double yMax, int width, int height, int maxIterations):
-  cdef double[:] realNums = np.linspace(xMin, xMax, width)
-  cdef double[:] imagNums = np.linspace(yMin, yMax, height)
-  cdef int[:,:] escapeCounts = np.empty((width, height), np.int)
-  cdef int i, j
-  
-  for i in range(width):
-    for j in range(height):
-      escapeCounts[i, j] = mandelbrot_cython_func(realNums[i], imagNums[j], maxIterations)
-    
-  return (realNums, imagNums, escapeCounts)
+cpdef mandelbrot_set_cython_func(double xMin, double xMax, double yMin, double yMax, int width, int height, int maxIterations,
+                                 bint fast = False, precision = np.float64, output = 'counts', out = None, int threads = 0,
+                                 times = None):
+  dtype = np.dtype(precision)
+  realNums = np.linspace(xMin, xMax, width, dtype = dtype)
+  imagNums = np.linspace(yMin, yMax, height, dtype = dtype)
+  outType = dtype if output == 'smooth' else np.dtype(np.int32)
+  if out is None:
+    escapeCounts = np.empty((height, width), outType)
+  else:                                     # Caller-supplied buffer, written in place (e.g. a tile of a bigger frame)
+    if out.shape != (height, width) or out.dtype != outType or not out.flags['C_CONTIGUOUS']:
+      raise ValueError('out must be a C-contiguous ' + outType.name + ' array of shape ' + str((height, width)))
+    escapeCounts = out
+  cdef double[:, ::1] timesView             # Optional (height, 3) float64 array for per-row (thread, start, end)
+  cdef double* timesPointer = NULL
+  if times is not None:
+    timesView = times
+    timesPointer = &timesView[0, 0]
 
+  # Typed views pick the float or double specialization of the kernels
+  cdef float[::1]  realNums32, imagNums32
+  cdef double[::1] realNums64, imagNums64
+  cdef int[:, ::1] counts
+  cdef float[:, ::1] smooth32
+  cdef double[:, ::1] smooth64
+  if dtype == np.float32:
+    realNums32, imagNums32 = realNums, imagNums
+    if output == 'smooth':
+      smooth32 = escapeCounts
+      with nogil:
+        mandelbrot_cython_smooth[cython.float](realNums32, imagNums32, smooth32, maxIterations, threads, timesPointer)
+    else:
+      counts = escapeCounts
+      with nogil:
+        mandelbrot_cython_counts[cython.float](realNums32, imagNums32, counts, maxIterations, fast, threads, timesPointer)
+  else:
+    realNums64, imagNums64 = realNums, imagNums
+    if output == 'smooth':
+      smooth64 = escapeCounts
+      with nogil:
+        mandelbrot_cython_smooth[cython.double](realNums64, imagNums64, smooth64, maxIterations, threads, timesPointer)
+    else:
+      counts = escapeCounts
+      with nogil:
+        mandelbrot_cython_counts[cython.double](realNums64, imagNums64, counts, maxIterations, fast, threads, timesPointer)
 
+  return (realNums, imagNums, escapeCounts)
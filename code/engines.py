@@ -0,0 +1,159 @@
+'''
+  Engine registry.
+
+  Every mandelbrot_set_* backend registers itself here with @register, declaring:
+    dtype    - the floating point precision its coordinates are computed in
+    layout   - memory layout of the escape count array it returns ('C' = row-major)
+    interior - what points inside the set come back as: 'zero' or 'max' (maxIterations)
+    parallel - whether it uses more than one core
+  and, for backends that take precision= / output= keyword arguments, which values they accept.
+
+  All backends share one result contract: (realNums, imagNums, escapeCounts), where escapeCounts is a
+  contiguous int32 array of shape (height, width), indexed [imag, real]. No transposes, no reshapes.
+  With output = 'smooth' the array holds fractional (continuous) escape times in the requested precision instead.
+
+  Backends are imported lazily, the first time get() asks for them, so a missing optional dependency (c_mandelbrot
+  not built, no mpi4py, ...) only takes out that one engine. It is then reported as unavailable, with the reason.
+  With instrumentation on (instrument.enable()) get() hands out wrapped functions that record every call. Backends
+  report to it through the hooks at the bottom (phase, instrumented, reportChunks), so none of them imports
+  instrument, and with it off each hook is one None check. The phase boundary is the same for every backend:
+    setup   from the call to phase('kernel'): grids, allocations, a reference orbit, pool/buffer set-up
+    kernel  the escape-time computation itself, up to phase('post')
+    post    from phase('post') to the return: reshapes, copies out of shared buffers, coordinate fix-ups
+  Backends that are a single JIT function (numba, numba_better) can't call out mid-way and count as all kernel.
+'''
+
+import collections, importlib, numpy as np
+
+INTERIOR_ZERO = 'zero'  # Interior points come back as 0
+INTERIOR_MAX  = 'max'   # Interior points come back as maxIterations
+
+OUTPUT_COUNTS = 'counts'  # Integer escape counts (the default everywhere)
+OUTPUT_SMOOTH = 'smooth'  # Normalized iteration count n + 1 - log2(log|z|), 0.0 inside the set
+SMOOTH_BAILOUT = 256.0 * 256.0  # |z|^2 to escape at in smooth mode; a big radius makes the fractional part smooth
+
+Engine = collections.namedtuple('Engine', ['name', 'func', 'dtype', 'layout', 'interior', 'parallel', 'precisions', 'outputs'])
+
+_ENGINES = {}
+_UNAVAILABLE = {}  # Engine name -> why its module failed to import
+_instrument = None # The instrument module while instrument.enable() is on (None: get() returns funcs untouched)
+
+# Engine name -> module that registers it
+_MODULES = {
+  'purepython':      'mandelbrot1_purepython',
+  'numpy':           'mandelbrot2_numpy',
+  'numpy_better':    'mandelbrot2a_numpy_better',
+  'numpy_compact':   'mandelbrot2b_numpy_compact',
+  'numba':           'mandelbrot3_numba',
+  'numba_better':    'mandelbrot3a_numba_better',
+  'numba_betterer':  'mandelbrot3a_numba_betterer',
+  'numba_aot':       'mandelbrot3b_numba_aot',
+  'numba_simd':      'mandelbrot3c_numba_simd',
+  'numexpr':         'mandelbrot4_numexpr',
+  'cython':          'mandelbrot5_cython',
+  'multiprocessing': 'mandelbrot6_multiprocessing',
+  'mpi':             'mandelbrot7_mpi',
+  'mariani_silver':  'mandelbrot8_mariani_silver',
+  'perturbation':    'mandelbrot9_perturbation',
+  'tiled':           'mandelbrot_tiled',
+  'cached':          'mandelbrot_cache',
+}
+
+def register(name, dtype, layout = 'C', interior = INTERIOR_ZERO, parallel = False, precisions = None, outputs = (OUTPUT_COUNTS,)):
+  assert layout == 'C', 'Only row-major (height, width) output is supported'
+  assert interior in (INTERIOR_ZERO, INTERIOR_MAX)
+  precisions = tuple(np.dtype(p) for p in (precisions or (dtype,)))
+  def decorator(func):
+    _ENGINES[name] = Engine(name, func, np.dtype(dtype), layout, interior, parallel, precisions, tuple(outputs))
+    return func
+  return decorator
+
+def load(name):
+  '''Imports the engine's module on first use. True if it is available, False if not (see unavailable()).'''
+  if name in _ENGINES:
+    return True
+  if name in _UNAVAILABLE:
+    return False
+  if name not in _MODULES:
+    raise KeyError('No engine registered as ' + repr(name) + ', choose from ' + ', '.join(names()))
+  try:
+    importlib.import_module(_MODULES[name])
+  except ImportError as error:
+    _UNAVAILABLE[name] = str(error)
+    return False
+  if name not in _ENGINES:
+    _UNAVAILABLE[name] = _MODULES[name] + ' did not register it'
+  return name in _ENGINES
+
+def get(name):
+  if not load(name):
+    raise ImportError('Engine ' + repr(name) + ' is unavailable: ' + _UNAVAILABLE[name])
+  if _instrument is not None:
+    return _ENGINES[name]._replace(func = _instrument.wrap(_ENGINES[name]))
+  return _ENGINES[name]
+
+def names():
+  '''Every known engine, loaded or not.'''
+  return list(_MODULES) + [name for name in _ENGINES if name not in _MODULES]
+
+def available():
+  '''Engines that import cleanly (imports all of them).'''
+  return [name for name in names() if load(name)]
+
+def unavailable():
+  return dict(_UNAVAILABLE)
+
+def checkMode(precision, output, fast = False):
+  '''Validates the precision= / output= keyword arguments a backend was given.'''
+  if np.dtype(precision) not in (np.float32, np.float64):
+    raise ValueError('precision must be float32 or float64, got ' + str(precision))
+  if output not in (OUTPUT_COUNTS, OUTPUT_SMOOTH):
+    raise ValueError('output must be ' + repr(OUTPUT_COUNTS) + ' or ' + repr(OUTPUT_SMOOTH) + ', got ' + repr(output))
+  if fast and output != OUTPUT_COUNTS:
+    raise ValueError('the fast interior path only returns escape counts')
+
+def checkResult(result, width, height, output = OUTPUT_COUNTS):
+  '''Asserts a backend's return value honours the shared contract.'''
+  realNums, imagNums, escapeCounts = result
+  assert len(realNums) == width and len(imagNums) == height
+  if output == OUTPUT_SMOOTH:
+    assert escapeCounts.dtype in (np.float32, np.float64), 'smooth output must be float32/64, got ' + str(escapeCounts.dtype)
+  else:
+    assert escapeCounts.dtype == np.int32,                 'escapeCounts must be int32, got ' + str(escapeCounts.dtype)
+  assert escapeCounts.shape == (height, width),          'escapeCounts must be (height, width), got ' + str(escapeCounts.shape)
+  assert escapeCounts.flags['C_CONTIGUOUS'],             'escapeCounts must be C-contiguous'
+  return result
+
+def frameWork(engine, result, maxIterations):
+  '''(escaped, capped, iterations) a frame implies: a pixel that escaped at count n ran n + 1 iterations, a capped
+  one ran maxIterations. Interior-zero engines also return 0 for |c| > 2 (escaped straight away), so the
+  coordinates tell those apart from the interior. Shared by benchmark.py and instrument.py.'''
+  realNums, imagNums, escapeCounts = result[:3]
+  if escapeCounts.dtype.kind == 'f':           # Smooth output: 0.0 inside, n + 1 - log2(log|z|) outside
+    cappedCount = escapeCounts.size - int(np.count_nonzero(escapeCounts))
+    escapedIterations = int(np.floor(escapeCounts).sum())
+  else:
+    total = int(escapeCounts.sum(dtype = np.int64))
+    if engine.interior == INTERIOR_MAX:
+      cappedCount = int(np.count_nonzero(escapeCounts == maxIterations))
+      total -= cappedCount * maxIterations
+    else:                                      # |c|^2 only at the zero pixels, not a full-frame float64 array
+      rows, columns = np.nonzero(escapeCounts == 0)
+      magnitude = np.asarray(imagNums, np.float64)[rows] ** 2 + np.asarray(realNums, np.float64)[columns] ** 2
+      cappedCount = int(np.count_nonzero(magnitude <= 4.0))
+    escapedIterations = total + escapeCounts.size - cappedCount
+  return escapeCounts.size - cappedCount, cappedCount, escapedIterations + cappedCount * maxIterations
+
+def phase(name):
+  '''Called by a backend as it moves on to 'kernel' or 'post' (see the top of this file).'''
+  if _instrument is not None:
+    _instrument.phase(name)
+
+def instrumented():
+  '''True inside an instrumented call on this thread; backends only collect per-chunk timings then.'''
+  return _instrument is not None and _instrument.active()
+
+def reportChunks(workers, starts, ends):
+  '''Finished work units of a parallel backend: which thread/process ran each one, and when (any clock, seconds).'''
+  if _instrument is not None:
+    _instrument.chunks(workers, starts, ends)
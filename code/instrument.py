@@ -0,0 +1,164 @@
+'''
+  Opt-in per-call instrumentation for every engine, logged as JSON lines.
+
+  instrument.enable() makes engines.get() hand out wrapped engine functions (fetch engines after enabling); each call
+  then records:
+    iterations          inner-loop iterations the escape counts imply (engines.frameWork, as in benchmark.py): the escape
+                        count + 1 of every pixel that escaped plus maxIterations for every pixel that was capped
+                        (engines that skip work - the fast interior path, mariani_silver, cached - really run fewer)
+    escaped / capped    pixels that escaped vs. ran out of iterations, and escapedPerSecond / iterationsPerSecond
+    setup/kernel/post   wall time split at the same boundary for every backend, which marks where its kernel starts
+                        and ends with engines.phase() (see engines.py); a single JIT function is all 'kernel'
+    peakBytes           tracemalloc peak above what was allocated before the call (Python and NumPy allocations only;
+                        memory a JIT kernel allocates in nopython code isn't seen). Tracing slows allocation-heavy
+                        backends down, pure Python most: enable(memory = False) for clean timings
+    threads / imbalance per worker thread or process: chunks, busy seconds, first start to last end; max / mean busy,
+                        for the parallel backends that report their chunks (cython, multiprocessing, numba_simd,
+                        numba_betterer)
+
+  Disabled (the default) engines.get() returns the functions untouched and the backends' engines.phase() etc. hooks
+  return after one None check per call; nothing is added per pixel or per iteration.
+
+    python instrument.py --engines numpy_compact,cython,multiprocessing --log calls.jsonl
+'''
+
+import argparse, collections, datetime, functools, json, platform, sys, threading, time, tracemalloc, numpy as np
+import engines
+
+_KEEP = 1000  # Records kept in memory (the log file keeps everything)
+
+records  = collections.deque(maxlen = _KEEP)
+_log     = None                                # Path of the JSON lines log, or None
+_memory  = False                               # Whether calls record peakBytes
+_started = False                               # Whether enable() started tracemalloc (so disable() stops it)
+_lock    = threading.Lock()                    # Serializes writes to the log
+_state   = threading.local()                   # .record: the call being measured on this thread, if any; .nested: depth of
+                                               # engine calls inside it (their phase marks are not the outer call's)
+
+def enable(log = None, memory = True):
+  '''Instruments every engine fetched with engines.get() from now on; log = a file to append a JSON line per call to.'''
+  global _log, _memory, _started
+  _log, _memory = log, memory
+  if memory and not tracemalloc.is_tracing():
+    tracemalloc.start()
+    _started = True
+  engines._instrument = sys.modules[__name__]
+
+def disable():
+  global _log, _memory, _started
+  engines._instrument = None
+  if _started:
+    tracemalloc.stop()
+  _log, _memory, _started = None, False, False
+
+def active():
+  '''True inside an instrumented call on this thread (engines.instrumented()).'''
+  return getattr(_state, 'record', None) is not None
+
+def phase(name):
+  '''A backend moving on to 'kernel' or 'post' (engines.phase()); the time so far goes to the phase it was in.'''
+  record = getattr(_state, 'record', None)
+  if record is not None and not getattr(_state, 'nested', 0):
+    now = time.perf_counter()
+    record[record['_phase']] += now - record['_mark']
+    record['_phase'], record['_mark'], record['_marked'] = name, now, True
+
+def chunks(workers, starts, ends):
+  '''Finished work units a backend reported with engines.reportChunks().'''
+  record = getattr(_state, 'record', None)
+  if record is not None:
+    record['_chunks'].append((np.asarray(workers).ravel(), np.asarray(starts, np.float64).ravel(), np.asarray(ends, np.float64).ravel()))
+
+def _threads(reported):
+  workers, starts, ends = (np.concatenate(column) for column in zip(*reported))
+  threads = []
+  for worker in np.unique(workers):
+    mine = workers == worker
+    threads.append({'id': int(worker), 'chunks': int(mine.sum()), 'busy': float((ends[mine] - starts[mine]).sum()),
+                    'span': float(ends[mine].max() - starts[mine].min())})
+  busy = [thread['busy'] for thread in threads]
+  return threads, max(busy) / (sum(busy) / len(busy)) if sum(busy) > 0 else 1.0
+
+def wrap(engine):
+  '''engine.func, recording every call.'''
+  @functools.wraps(engine.func)
+  def instrumented(xMin, xMax, yMin, yMax, width, height, maxIterations, *args, **kwargs):
+    if active():                               # Nested (e.g. 'cached' rendering through another engine): the outer call owns it
+      _state.nested = getattr(_state, 'nested', 0) + 1
+      try:
+        return engine.func(xMin, xMax, yMin, yMax, width, height, maxIterations, *args, **kwargs)
+      finally:
+        _state.nested -= 1
+    record = _state.record = {'engine': engine.name, 'width': width, 'height': height, 'maxIterations': maxIterations,
+                              'options': {key: str(value) for key, value in kwargs.items()}, 'setup': 0.0, 'kernel': 0.0, 'post': 0.0,
+                              '_phase': 'setup', '_marked': False, '_chunks': []}
+    if _memory:
+      tracemalloc.reset_peak()
+      before = tracemalloc.get_traced_memory()[0]
+    start = record['_mark'] = time.perf_counter()
+    try:
+      result = engine.func(xMin, xMax, yMin, yMax, width, height, maxIterations, *args, **kwargs)
+    finally:
+      end = time.perf_counter()
+      _state.record = None
+    record[record['_phase']] += end - record['_mark']
+    if not record['_marked']:                  # Backend without phase() marks: all of it is kernel
+      record['kernel'], record['setup'] = record['setup'], 0.0
+    record['seconds'] = end - start
+    if _memory:
+      record['peakBytes'] = tracemalloc.get_traced_memory()[1] - before
+    if result is not None and result[2] is not None:   # MPI ranks other than 0 get no escape counts
+      record['escaped'], record['capped'], record['iterations'] = engines.frameWork(engine, result, maxIterations)
+      record['escapedPerSecond'] = record['escaped'] / record['seconds'] if record['seconds'] > 0 else None
+      record['iterationsPerSecond'] = record['iterations'] / record['seconds'] if record['seconds'] > 0 else None
+    if record['_chunks']:
+      record['threads'], record['imbalance'] = _threads(record['_chunks'])
+    for key in ('_phase', '_mark', '_marked', '_chunks'):
+      del record[key]
+    record['date'] = datetime.datetime.now().isoformat(timespec = 'seconds')
+    record['host'] = platform.node()
+    records.append(record)
+    if _log is not None:
+      with _lock, open(_log, 'a') as file:
+        file.write(json.dumps(record) + '\n')
+    return result
+  return instrumented
+
+def describe(record):
+  '''One line (two with thread timings) for printing.'''
+  line = (record['engine'] + ' ' + str(record['width']) + 'x' + str(record['height']) + ':' + str(record['maxIterations'])
+          + '  %.4fs (setup %.4f kernel %.4f post %.4f)' % (record['seconds'], record['setup'], record['kernel'], record['post']))
+  if 'escaped' in record:
+    line += ('  escaped %d capped %d  %.3g escaped/s  %.3g it/s'
+             % (record['escaped'], record['capped'], record['escapedPerSecond'] or 0, record['iterationsPerSecond'] or 0))
+  if 'peakBytes' in record:
+    line += '  peak %.1f MB' % (record['peakBytes'] / 2 ** 20)
+  if 'threads' in record:
+    line += ('\n    imbalance %.3f, busy per thread: ' % record['imbalance']
+             + ' '.join('%.4f' % thread['busy'] for thread in record['threads']))
+  return line
+
+# Instrumented calls of a few engines, printed and optionally logged
+# Through the imported module: the backends report to that one, not to this file run as __main__
+if __name__ == '__main__':
+  import instrument
+  parser = argparse.ArgumentParser(description = 'Per-call instrumentation of Mandelbrot engines')
+  parser.add_argument('--engines',    default = 'numpy_compact,numba_betterer,numba_simd,cython,multiprocessing')
+  parser.add_argument('--width',      type = int,   default = 1000)
+  parser.add_argument('--height',     type = int,   default = 1000)
+  parser.add_argument('--iterations', type = int,   default = 80)
+  parser.add_argument('--view',       type = float, nargs = 4, default = [-2.0, 0.5, -1.2, 1.2], metavar = ('XMIN', 'XMAX', 'YMIN', 'YMAX'))
+  parser.add_argument('--log',        help = 'append one JSON line per call to this file')
+  parser.add_argument('--no-memory',  action = 'store_true', help = 'skip tracemalloc (cleaner timings)')
+  args = parser.parse_args()
+
+  for name in args.engines.split(','):
+    if not engines.load(name):
+      print(name + '\tunavailable (' + engines.unavailable()[name] + ')')
+      continue
+    instrument.enable(None, not args.no_memory)
+    engines.get(name).func(*args.view, 16, 16, args.iterations)   # JIT / pool warm-up (and the timed kernels), not logged
+    instrument.enable(args.log, not args.no_memory)
+    engines.get(name).func(*args.view, args.width, args.height, args.iterations)
+    instrument.disable()
+    print(instrument.describe(instrument.records[-1]))
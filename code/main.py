@@ -16,19 +16,10 @@
 #########
 # Imports
 #########
-import time, utils
+import time, utils, engines
 from utils import timed, printTitle
-from mandelbrot1_purepython      import mandelbrot_set_purepython,      mandelbrot_purepython
-from mandelbrot2_numpy           import mandelbrot_set_numpy,           mandelbrot_numpy
-from mandelbrot2a_numpy_better   import mandelbrot_set_numpy_better,    mandelbrot_numpy_better
-from mandelbrot3_numba           import mandelbrot_set_numba,           mandelbrot_numba
-from mandelbrot3a_numba_better   import mandelbrot_set_numba_better,    mandelbrot_numba_better
-from mandelbrot3a_numba_betterer import mandelbrot_set_numba_betterer,  mandelbrot_numba_betterer2, mandelbrot_numba_betterer3
-from mandelbrot4_numexpr         import mandelbrot_set_numexpr,         mandelbrot_numexpr
-from mandelbrot5_cython          import mandelbrot_set_cython
-from mandelbrot6_multiprocessing import mandelbrot_set_multiprocessing, mandelbrot_multiprocessing
-from mandelbrot7_mpi             import mandelbrot_set_mpi,             mandelbrot_mpi
-from mandelbrot_visualizer       import visualize
+# Backends (and matplotlib, line_profiler) are imported on first use, see engines.py;
+# one that can't load (e.g. c_mandelbrot not built) is skipped with the reason instead of breaking everything
 
 ###################
 # Mandelbrot inputs
@@ -56,6 +47,7 @@ assert _WIDTH == _HEIGHT    # These must be the same
 _EXECUTION_RUNS     = 5                           # This is to get an average execution time, rather than just one
 _VISUALIZE          = True                       # True for visualization and timings, False just for timings
 _SEE_ONE            = False                       # True to quickly visualize once (uses the fastest numba function), False to see all
+_PROGRESSIVE        = False                       # With _SEE_ONE: a coarse preview at once, refined in passes (pan/zoom re-renders)
 _INCREASE_LOAD      = False                       # True to repeatedly run, gradually increasing input sizes to see how well the implementations do
 _LOAD_AMT           = .2                          # 20% increase by default
 _LOAD_TIMES         = 20                          # 20 load increases by default
@@ -66,60 +58,82 @@ assert not _VISUALIZE & _INCREASE_LOAD            # Disallow visualization with
 # Meta arguments for profiling
 ##############################
 _PROFILING          = False                       # False if running, True if profiling (profiling is one at a time)
-_FUNC_TO_PROFILE    = mandelbrot_set_purepython   # Set to whatever function you want to profile
-_SUBFUNC_TO_PROFILE = mandelbrot_purepython       # This has to be the Mandelbrot function in the same file as the main one
+_FUNC_TO_PROFILE    = 'purepython'                # Set to whatever engine you want to profile
+_SUBFUNC_TO_PROFILE = 'mandelbrot_purepython'     # This has to be the Mandelbrot function in the same file as the main one
 # mandelbrot_numba_betterer2 mandelbrot_numba_betterer3
 assert not _VISUALIZE & _PROFILING                # Disallow visualization and profiling at once (pick one)
 
-printTitle()
+####################################
+# Meta arguments for instrumentation
+####################################
+_INSTRUMENT         = False                       # True to record every engine call (works with everything above), see instrument.py
+_INSTRUMENT_LOG     = 'instrument.jsonl'          # One JSON line per call is appended here
 
-# Grab all function names
-possibles = globals().copy()
-possibles.update(locals())
+# Guarded so multiprocessing workers that re-import this file (spawn) don't run it all again
+if __name__ == '__main__':
+  printTitle()
+  if _INSTRUMENT:
+    import instrument
+    instrument.enable(_INSTRUMENT_LOG)
 
-# PROFILING
-if _PROFILING:
-  print('\n', '#' * 17, '\n # line_profiler #\n', '#' * 17)
-  from line_profiler import LineProfiler
-  lprof = LineProfiler()
-  lprof.add_function(_FUNC_TO_PROFILE)
-  lprof.add_function(_SUBFUNC_TO_PROFILE)
-  lprofWrapper = lprof(_FUNC_TO_PROFILE)
-  lprofWrapper(_XMIN, _XMAX, _YMIN, _YMAX, _WIDTH, _HEIGHT, _MAX_ITERATIONS)
-  lprof.print_stats()
-# RUNNING
-else:
-  if not _VISUALIZE:
-    # RUN EACH IMPLEMENTATION ONCE
-    if not _INCREASE_LOAD:
-      for stringName, funcName in utils.funcs.items():
-        funcTimed = timed(possibles.get(funcName))
-        avgAlgTime = sum(funcTimed(_XMIN, _XMAX, _YMIN, _YMAX, _WIDTH, _HEIGHT, _MAX_ITERATIONS) for _ in range(_EXECUTION_RUNS)) / _EXECUTION_RUNS
-        print(stringName + '\t\t' + str(avgAlgTime) + 's')
-      # TODO time multiprocessing, mpi
-    # INCREMENTALLY INCREASE LOAD ON ALL IMPLEMENTATIONS
-    else:
-      for i in range(_LOAD_TIMES):
-        print(_WIDTH, 'x', _HEIGHT, ':', _MAX_ITERATIONS, 'iterations')
+  # PROFILING
+  if _PROFILING:
+    print('\n', '#' * 17, '\n # line_profiler #\n', '#' * 17)
+    import sys
+    from line_profiler import LineProfiler
+    funcToProfile = engines.get(_FUNC_TO_PROFILE).func
+    lprof = LineProfiler()
+    lprof.add_function(funcToProfile)
+    lprof.add_function(getattr(sys.modules[funcToProfile.__module__], _SUBFUNC_TO_PROFILE))
+    lprofWrapper = lprof(funcToProfile)
+    lprofWrapper(_XMIN, _XMAX, _YMIN, _YMAX, _WIDTH, _HEIGHT, _MAX_ITERATIONS)
+    lprof.print_stats()
+  # RUNNING
+  else:
+    if not _VISUALIZE:
+      # RUN EACH IMPLEMENTATION ONCE
+      if not _INCREASE_LOAD:
         for stringName, funcName in utils.funcs.items():
-          funcTimed = timed(possibles.get(funcName))
+          if not engines.load(funcName):
+            print(stringName + '\t\tunavailable (' + engines.unavailable()[funcName] + ')')
+            continue
+          engines.get(funcName).func(_XMIN, _XMAX, _YMIN, _YMAX, 16, 16, _MAX_ITERATIONS)  # JIT / pool warm-up, not timed
+          funcTimed = timed(engines.get(funcName).func)
           avgAlgTime = sum(funcTimed(_XMIN, _XMAX, _YMIN, _YMAX, _WIDTH, _HEIGHT, _MAX_ITERATIONS) for _ in range(_EXECUTION_RUNS)) / _EXECUTION_RUNS
-          if _NOISY:
-            print(stringName + '\t\t' + str(avgAlgTime) + 's')
-          else:
-            print(str(avgAlgTime))
-        _WIDTH          += int(_WIDTH          * _LOAD_AMT)
-        _HEIGHT         += int(_HEIGHT         * _LOAD_AMT)
-        _MAX_ITERATIONS += int(_MAX_ITERATIONS * _LOAD_AMT)
-        # TODO time multiprocessing, mpi
-  # VISUALIZING
-  else:
-    # QUICKLY SEE A VISUALIZATION
-    if _SEE_ONE:
-      visualize(_XMIN, _XMAX, _YMIN, _YMAX, _MAX_ITERATIONS, mandelbrot_set_numba_betterer, 'Betterer Numba:')
-    # RUN ALL VISUALIZATIONS (FOR TESTING ACCURACY)
+          print(stringName + '\t\t' + str(avgAlgTime) + 's')
+          if _INSTRUMENT:
+            print('\t' + instrument.describe(instrument.records[-1]))
+        # MPI is timed on its own under mpirun, see mandelbrot7_mpi.py (or benchmark.py, which sweeps every engine)
+      # INCREMENTALLY INCREASE LOAD ON ALL IMPLEMENTATIONS
+      else:
+        for i in range(_LOAD_TIMES):
+          print(_WIDTH, 'x', _HEIGHT, ':', _MAX_ITERATIONS, 'iterations')
+          for stringName, funcName in utils.funcs.items():
+            if not engines.load(funcName):
+              continue
+            engines.get(funcName).func(_XMIN, _XMAX, _YMIN, _YMAX, 16, 16, _MAX_ITERATIONS)  # JIT / pool warm-up, not timed
+            funcTimed = timed(engines.get(funcName).func)
+            avgAlgTime = sum(funcTimed(_XMIN, _XMAX, _YMIN, _YMAX, _WIDTH, _HEIGHT, _MAX_ITERATIONS) for _ in range(_EXECUTION_RUNS)) / _EXECUTION_RUNS
+            if _NOISY:
+              print(stringName + '\t\t' + str(avgAlgTime) + 's')
+            else:
+              print(str(avgAlgTime))
+          _WIDTH          += int(_WIDTH          * _LOAD_AMT)
+          _HEIGHT         += int(_HEIGHT         * _LOAD_AMT)
+          _MAX_ITERATIONS += int(_MAX_ITERATIONS * _LOAD_AMT)
+          # MPI is timed on its own under mpirun, see mandelbrot7_mpi.py
+    # VISUALIZING
     else:
-      for stringName, funcName in utils.funcs.items():
-        if (stringName == 'Pure Python:'):
-          continue
-        visualize(_XMIN, _XMAX, _YMIN, _YMAX, _MAX_ITERATIONS, possibles.get(funcName), stringName)
\ No newline at end of file
+      from mandelbrot_visualizer import visualize
+      # QUICKLY SEE A VISUALIZATION
+      if _SEE_ONE and _PROGRESSIVE:
+        from mandelbrot_visualizer import visualize_progressive
+        visualize_progressive(_XMIN, _XMAX, _YMIN, _YMAX, _MAX_ITERATIONS, 'Progressive:')
+      elif _SEE_ONE:
+        visualize(_XMIN, _XMAX, _YMIN, _YMAX, _MAX_ITERATIONS, engines.get('numba_betterer').func, 'Betterer Numba:')
+      # RUN ALL VISUALIZATIONS (FOR TESTING ACCURACY)
+      else:
+        for stringName, funcName in utils.funcs.items():
+          if (stringName == 'Pure Python:') or not engines.load(funcName):
+            continue
+          visualize(_XMIN, _XMAX, _YMIN, _YMAX, _MAX_ITERATIONS, engines.get(funcName).func, stringName)
\ No newline at end of file
@@ -6,6 +6,7 @@
 '''
 
 import numpy as np
+from engines import register, phase, INTERIOR_MAX
 
 def mandelbrot_purepython(c, maxIterations):
   z = 0                           # z always starts as 0
@@ -15,12 +16,15 @@ def mandelbrot_purepython(c, maxIterations):
     z = z * z + c                 # Mandelbrot (z ** 2 is MUCH slower; about 40%)
   return maxIterations            # Otherwise, return max iterations
 
+@register('purepython', np.float64, interior = INTERIOR_MAX)
 def mandelbrot_set_purepython(xMin, xMax, yMin, yMax, width, height, maxIterations):
   realNums = np.linspace(xMin, xMax, width)
   imagNums = np.linspace(yMin, yMax, height)
-  escapeCounts = []
-  for r in realNums:
-    for i in imagNums:
+  escapeCounts = np.empty((height, width), np.int32)
+  phase('kernel')
+  for j, i in enumerate(imagNums):
+    for k, r in enumerate(realNums):
       # Uses complex(), which is the same as real + imaginary * 1j
-      escapeCounts.append(mandelbrot_purepython(complex(r, i), maxIterations))
+      escapeCounts[j, k] = mandelbrot_purepython(complex(r, i), maxIterations)
+  phase('post')
   return (realNums, imagNums, escapeCounts)
\ No newline at end of file
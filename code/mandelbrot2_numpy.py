@@ -6,9 +6,10 @@
 '''
 
 import numpy as np
+from engines import register, phase
 
 def mandelbrot_numpy(c, maxIterations):
-  escapeCount = np.resize(np.array(0,), c.shape)     # Use np array to store output iterations count
+  escapeCount = np.zeros(c.shape, np.int32)     # Use np array to store output iterations count
   z = np.zeros(c.shape, np.complex64)           # Use np array for updating z, same shape as q but datatype complex64
 
   for iteration in range(maxIterations):
@@ -19,10 +20,13 @@ def mandelbrot_numpy(c, maxIterations):
     escapeCount = np.where(done, iteration, escapeCount)  # np.where() returns iteration if true, output if false
   return escapeCount
 
+@register('numpy', np.float32)
 def mandelbrot_set_numpy(xMin, xMax, yMin, yMax, width, height, maxIterations):
   realNums     = np.linspace(xMin, xMax, width, dtype = np.float32)   # If we do not declare the datatypes here, it is actually about 40% slower
   imagNums     = np.linspace(yMin, yMax, height, dtype = np.float32)  # ^^^
   complexNums  = np.ravel(realNums + imagNums[:,None] * 1j)           # Make a temporary 1D array of complex numbers (r + i * 1j)
+  phase('kernel')
   escapeCounts = mandelbrot_numpy(complexNums, maxIterations)
-  escapeCounts = escapeCounts.reshape((width, height))                # Reshape output of Mandelbrot to be nice 2D array
-  return (realNums, imagNums, escapeCounts.T)
\ No newline at end of file
+  phase('post')
+  escapeCounts = escapeCounts.reshape((height, width))                # Reshape output of Mandelbrot to be nice 2D array (a view, no copy)
+  return (realNums, imagNums, escapeCounts)
\ No newline at end of file
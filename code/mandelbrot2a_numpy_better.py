@@ -6,9 +6,10 @@
 '''
 
 import numpy as np
+from engines import register, phase
 
 def mandelbrot_numpy_better(c, maxIterations):
-  escapeCount = np.zeros(c.shape)                                           
+  escapeCount = np.zeros(c.shape, np.int32)                                         
   z = np.zeros(c.shape, np.complex64)                                  
 
   for iteration in range(maxIterations):
@@ -19,9 +20,12 @@ def mandelbrot_numpy_better(c, maxIterations):
   escapeCount[escapeCount == maxIterations - 1] = 0                              
   return escapeCount
 
+@register('numpy_better', np.float32)
 def mandelbrot_set_numpy_better(xMin, xMax, yMin, yMax, width, height, maxIterations):
   realNums = np.linspace(xMin, xMax, width, dtype = np.float32)
   imagNums = np.linspace(yMin, yMax, height, dtype = np.float32)
   complexNums = realNums + imagNums[:, None] * 1j                               
+  phase('kernel')
   escapeCounts = mandelbrot_numpy_better(complexNums, maxIterations)   
-  return (realNums, imagNums, escapeCounts.T) 
\ No newline at end of file
+  phase('post')
+  return (realNums, imagNums, escapeCounts) 
\ No newline at end of file
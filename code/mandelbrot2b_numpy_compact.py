@@ -0,0 +1,89 @@
+'''
+  Calculates the Mandelbrot set using Numpy, iterating only the pixels that haven't escaped yet.
+
+  The other Numpy versions touch the whole frame on every iteration. Here the still-active pixels (their index,
+  z and c as separate real/imaginary arrays, float32 or float64) are packed into the front of preallocated buffers and every
+  _COMPACT_EVERY iterations the escaped ones are squeezed out. All the arithmetic goes through out= into those
+  buffers, so an iteration costs time proportional to the survivors and allocates nothing.
+
+  For machines where Numba isn't allowed and Numpy is the fallback.
+'''
+
+import numpy as np
+from engines import register, phase, checkMode, OUTPUT_COUNTS, OUTPUT_SMOOTH, SMOOTH_BAILOUT
+
+_COMPACT_EVERY = 8  # Iterations between compactions (escaped pixels ride along, masked off, until then)
+
+def mandelbrot_numpy_compact(c, maxIterations, compactEvery = _COMPACT_EVERY, precision = np.float32, output = OUTPUT_COUNTS):
+  size = c.size
+  smooth = output == OUTPUT_SMOOTH
+  escapeCount = np.zeros(size, precision if smooth else np.int32)
+  bailout = SMOOTH_BAILOUT if smooth else 4.0
+
+  # Two of each so compaction can gather from one into the other (np.take can't safely work in place)
+  index, indexNext = np.arange(size, dtype = np.intp), np.empty(size, np.intp)
+  zReal, zRealNext = np.zeros(size, precision), np.empty(size, precision)
+  zImag, zImagNext = np.zeros(size, precision), np.empty(size, precision)
+  cReal, cRealNext = np.ascontiguousarray(c.real, precision), np.empty(size, precision)
+  cImag, cImagNext = np.ascontiguousarray(c.imag, precision), np.empty(size, precision)
+  realSquared = np.empty(size, precision)
+  imagSquared = np.empty(size, precision)
+  active      = np.ones(size, bool)
+  escaped     = np.empty(size, bool)
+
+  count = size  # Pixels packed at the front of the buffers
+  with np.errstate(over = 'ignore', invalid = 'ignore'):  # Escaped pixels may overflow before the next compaction
+    for iteration in range(maxIterations):
+      zr, zi, cr, ci = zReal[:count], zImag[:count], cReal[:count], cImag[:count]
+      r2, i2, a, e = realSquared[:count], imagSquared[:count], active[:count], escaped[:count]
+
+      np.multiply(zr, zr, out = r2)
+      np.multiply(zi, zi, out = i2)
+      np.multiply(zr, zi, out = zi)        # z = z * z + c, written back in place
+      np.add(zi, zi, out = zi)
+      np.add(zi, ci, out = zi)
+      np.subtract(r2, i2, out = zr)
+      np.add(zr, cr, out = zr)
+
+      np.multiply(zr, zr, out = r2)        # Pythagorean theorem trick for |z| > 2
+      np.multiply(zi, zi, out = i2)
+      np.add(r2, i2, out = r2)
+      np.greater(r2, bailout, out = e)
+      np.logical_and(e, a, out = e)        # Only count the first escape
+      if e.any():
+        if smooth:                         # Fractional part from how far past the bailout |z| got
+          escapeCount[index[:count][e]] = iteration + 1 - np.log2(0.5 * np.log(r2[e].astype(np.float64)))
+        else:
+          escapeCount[index[:count][e]] = iteration
+        np.logical_xor(a, e, out = a)
+
+      if (iteration + 1) % compactEvery == 0:
+        keep = np.flatnonzero(a)
+        if keep.size == 0:
+          break
+        if keep.size < count:
+          newCount = keep.size
+          np.take(index[:count], keep, out = indexNext[:newCount])
+          np.take(zr, keep, out = zRealNext[:newCount])
+          np.take(zi, keep, out = zImagNext[:newCount])
+          np.take(cr, keep, out = cRealNext[:newCount])
+          np.take(ci, keep, out = cImagNext[:newCount])
+          index, indexNext = indexNext, index
+          zReal, zRealNext = zRealNext, zReal
+          zImag, zImagNext = zImagNext, zImag
+          cReal, cRealNext = cRealNext, cReal
+          cImag, cImagNext = cImagNext, cImag
+          active[:newCount] = True
+          count = newCount
+  return escapeCount                       # Never escaped: still 0
+
+@register('numpy_compact', np.float32, precisions = (np.float32, np.float64), outputs = (OUTPUT_COUNTS, OUTPUT_SMOOTH))
+def mandelbrot_set_numpy_compact(xMin, xMax, yMin, yMax, width, height, maxIterations, precision = np.float32, output = OUTPUT_COUNTS):
+  checkMode(precision, output)
+  realNums = np.linspace(xMin, xMax, width, dtype = precision)
+  imagNums = np.linspace(yMin, yMax, height, dtype = precision)
+  complexNums = np.ravel(realNums + imagNums[:, None] * 1j)
+  phase('kernel')
+  escapeCounts = mandelbrot_numpy_compact(complexNums, maxIterations, precision = precision, output = output)
+  phase('post')
+  return (realNums, imagNums, escapeCounts.reshape((height, width)))
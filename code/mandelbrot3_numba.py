@@ -7,8 +7,9 @@
 
 import numpy as np
 from numba import jit
+from engines import register
 
-@jit
+@jit(cache = True)
 def mandelbrot_numba(c, maxIterations):
   z = 0                                          # z always starts at 0
   for n in range(maxIterations):
@@ -17,13 +18,14 @@ def mandelbrot_numba(c, maxIterations):
     z = z * z + c                                # Same as pure Python code 
   return 0                                       # TODO returning 0 plots correctly; returning iterations inverts colors... why?
 
-@jit
+@register('numba', np.float64)
+@jit(cache = True)
 def mandelbrot_set_numba(xMin, xMax, yMin, yMax, width, height, maxIterations):
   realNums = np.linspace(xMin, xMax, width)   # Declaring datatypes here breaks the code :)
   imagNums = np.linspace(yMin, yMax, height)  # ^^^
-  escapeCounts = np.empty((width, height))
-  for i in range(width):
-    for j in range(height):
+  escapeCounts = np.empty((height, width), np.int32)
+  for j in range(height):
+    for i in range(width):
       # Same as complex(r, i) ... real + imaginary * 1j
-      escapeCounts[i, j] = mandelbrot_numba(realNums[i] + imagNums[j] * 1j, maxIterations)
+      escapeCounts[j, i] = mandelbrot_numba(realNums[i] + imagNums[j] * 1j, maxIterations)
   return (realNums, imagNums, escapeCounts)
\ No newline at end of file
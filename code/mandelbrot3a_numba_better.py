@@ -7,8 +7,9 @@
 
 import numpy as np
 from numba import jit
+from engines import register
 
-@jit
+@jit(cache = True)
 def mandelbrot_numba_better(cReal, cImag, maxIterations):
   real = cReal                        # Maintain original 'z' value
   imag = cImag                        # Maintain original 'z' value
@@ -21,14 +22,79 @@ def mandelbrot_numba_better(cReal, cImag, maxIterations):
     real = realNew - imagNew + cReal  # ... where the new a is a^2 - b^2 and the new b is 2ab
   return 0
 
-@jit
-def mandelbrot_set_numba_better(xMin, xMax, yMin, yMax, width, height, maxIterations):
+_PERIOD_TOLERANCE = 0.0  # How close the orbit has to come back to count as a cycle (0.0 = exact repeat, bit-identical results)
+
+# Opt-in fast path for interior points, which otherwise run all maxIterations
+# Same results as mandelbrot_numba_better, just skips work for points that can never escape
+@jit(cache = True)
+def mandelbrot_numba_better_fast(cReal, cImag, maxIterations, tolerance):
+  xQuarter = cReal - 0.25
+  q = xQuarter * xQuarter + cImag * cImag
+  if q * (q + xQuarter) <= 0.25 * cImag * cImag:                     # Inside the main cardioid (closed form)
+    return 0
+  if (cReal + 1.0) * (cReal + 1.0) + cImag * cImag <= 0.0625:        # Inside the period-2 bulb (circle of radius 1/4 at -1)
+    return 0
+  real = cReal
+  imag = cImag
+  oldReal = real                      # Brent-style cycle check: remember z every time the window doubles...
+  oldImag = imag
+  steps = 0
+  window = 8
+  for n in range(maxIterations):
+    realNew = real * real
+    imagNew = imag * imag
+    if realNew + imagNew > 4.0:
+      return n
+    imag = 2 * real * imag + cImag
+    real = realNew - imagNew + cReal
+    if abs(real - oldReal) <= tolerance and abs(imag - oldImag) <= tolerance:
+      return 0                        # ... and if the orbit comes back to it, it is periodic and will never escape
+    steps += 1
+    if steps == window:
+      steps = 0
+      window *= 2
+      oldReal = real
+      oldImag = imag
+  return 0
+
+# Fills a block of rows starting at row0, working out each pixel's coordinates from its index (no linspace grid)
+# Serial on purpose: the process-based backends (multiprocessing, MPI) do the parallelism themselves
+@jit(nogil = True, cache = True)
+def mandelbrot_numba_better_rows(xMin, xStep, yMin, yStep, row0, maxIterations, output):
+  for j in range(output.shape[0]):
+    cImag = yMin + (row0 + j) * yStep
+    for i in range(output.shape[1]):
+      output[j, i] = mandelbrot_numba_better(xMin + i * xStep, cImag, maxIterations)
+
+@register('numba_better', np.float64)
+@jit(cache = True)
+def mandelbrot_set_numba_better(xMin, xMax, yMin, yMax, width, height, maxIterations, fast = False, tolerance = _PERIOD_TOLERANCE):
   realNums = np.linspace(xMin, xMax, width)   # Declaring datatypes here breaks the code :)
   imagNums = np.linspace(yMin, yMax, height)  # ^^^
-  complexNums = np.empty((width, height))
-  for i in range(width):
-    for j in range(height):
+  complexNums = np.empty((height, width), np.int32)
+  for j in range(height):
+    for i in range(width):
       # No built-in Python complex-type... just pass in every complex as two floats
       # We will use this exact thing in Cython to get around not being able to cdef Complex types
-      complexNums[i, j] = mandelbrot_numba_better(realNums[i], imagNums[j], maxIterations)
-  return (realNums, imagNums, complexNums)
\ No newline at end of file
+      if fast:
+        complexNums[j, i] = mandelbrot_numba_better_fast(realNums[i], imagNums[j], maxIterations, tolerance)
+      else:
+        complexNums[j, i] = mandelbrot_numba_better(realNums[i], imagNums[j], maxIterations)
+  return (realNums, imagNums, complexNums)
+
+# Checks the fast path is bit-identical to the plain kernel: python mandelbrot3a_numba_better.py
+if __name__ == '__main__':
+  import time
+  views = {'full set': (-2.0, 0.5, -1.2, 1.2, 1000, 1000, 80),
+           'deep zoom': (-0.74877, -0.74872, 0.06505, 0.06510, 1000, 1000, 2048),
+           'full set, deep iterations': (-2.0, 0.5, -1.2, 1.2, 1000, 1000, 2048)}
+  for name, view in views.items():
+    mandelbrot_set_numba_better(*view[:4], 2, 2, 2)                     # JIT warm-up
+    mandelbrot_set_numba_better(*view[:4], 2, 2, 2, True)
+    time1 = time.perf_counter()
+    plain = mandelbrot_set_numba_better(*view)[2]
+    time2 = time.perf_counter()
+    fast  = mandelbrot_set_numba_better(*view, True)[2]
+    time3 = time.perf_counter()
+    assert np.array_equal(plain, fast), name + ': fast path differs from the plain kernel'
+    print(name + '\t\tplain ' + str(time2 - time1) + 's\tfast ' + str(time3 - time2) + 's')
\ No newline at end of file
@@ -5,33 +5,123 @@
   Calculates the Mandelbrot set using super-improved Numba. SO FASSSSSSST!!!!
 '''
 
-import numpy as np
-from numba import jit, vectorize, guvectorize, complex64, int32
+import numpy as np, numba
+from numba import jit, njit, prange, vectorize, guvectorize, complex64, complex128, int32, float32, float64
+from engines import register, phase, instrumented, reportChunks, checkMode, OUTPUT_COUNTS, OUTPUT_SMOOTH, SMOOTH_BAILOUT
+from mandelbrot3c_numba_simd import clockNow
 
-@jit(int32(complex64, int32))
+@jit([int32(complex64, int32), int32(complex128, int32)], cache = True)
 def mandelbrot_numba_betterer3(c, maxIterations):
-  realNew = 0
-  real  = 0
-  imag  = 0
+  real = c.real - c.real                                   # Zero in the precision of c: an int literal would promote float32 to float64
+  imag = real
   for n in range(maxIterations):
     realNew = real * real - imag * imag + c.real           # Uses the square of a complex number trick
-    imag = 2 * real * imag + c.imag
+    imag = (real + real) * imag + c.imag
     real = realNew
     if real * real + imag * imag > 4.0:     
       return n
   return 0
 
+# Opt-in fast path, same results as mandelbrot_numba_betterer3 (see mandelbrot_numba_better_fast for the details)
+@jit([int32(complex64, int32), int32(complex128, int32)], cache = True)
+def mandelbrot_numba_betterer3_fast(c, maxIterations):
+  cReal = float64(c.real)                                  # Closed-form tests in double so rounding can't flip a border pixel
+  cImag = float64(c.imag)
+  xQuarter = cReal - 0.25
+  q = xQuarter * xQuarter + cImag * cImag
+  if q * (q + xQuarter) <= 0.25 * cImag * cImag:           # Main cardioid
+    return 0
+  if (cReal + 1.0) * (cReal + 1.0) + cImag * cImag <= 0.0625:  # Period-2 bulb
+    return 0
+  real = c.real - c.real
+  imag = real
+  oldReal = real
+  oldImag = imag
+  steps  = 0
+  window = 8
+  for n in range(maxIterations):
+    realNew = real * real - imag * imag + c.real
+    imag = (real + real) * imag + c.imag
+    real = realNew
+    if real * real + imag * imag > 4.0:
+      return n
+    if real == oldReal and imag == oldImag:                # Orbit came back exactly: periodic, never escapes
+      return 0
+    steps += 1
+    if steps == window:
+      steps = 0
+      window *= 2
+      oldReal = real
+      oldImag = imag
+  return 0
+
+# Smooth (continuous) escape time: n + 1 - log2(log|z|), 0.0 for points that never escape
+# Stays in the precision of c the same way as mandelbrot_numba_betterer3
+@jit([float32(complex64, int32), float64(complex128, int32)], cache = True)
+def mandelbrot_numba_betterer3_smooth(c, maxIterations):
+  real = c.real - c.real
+  imag = real
+  for n in range(maxIterations):
+    realNew = real * real - imag * imag + c.real
+    imag = (real + real) * imag + c.imag
+    real = realNew
+    magnitude = real * real + imag * imag
+    if magnitude > SMOOTH_BAILOUT:
+      return n + 1 - np.log2(0.5 * np.log(magnitude))
+  return 0
+
 # The '(n),()->(n)' is an input template: means a 1D array and scalar are input, and a 1D array is output
 # target is set to parallel to use multiple cores; default is 'cpu'
-@guvectorize([(complex64[:], int32[:], int32[:])], '(n),()->(n)', target = 'parallel')
+@guvectorize([(complex64[:], int32[:], int32[:]), (complex128[:], int32[:], int32[:])], '(n),()->(n)', target = 'parallel', cache = True)
 def mandelbrot_numba_betterer2(c, maxIterations, output):
   maxIterationsTemp = maxIterations[0]                        # Temp array is necessary because guvectorize expects arrays
   for i in range(c.shape[0]):
     output[i] = mandelbrot_numba_betterer3(c[i], maxIterationsTemp)
-        
-def mandelbrot_set_numba_betterer(xMin, xMax, yMin, yMax, width, height, maxIterations):
-  realNums = np.linspace(xMin, xMax, width, dtype = np.float32)
-  imagNums = np.linspace(yMin, yMax, height, dtype = np.float32)
-  complexNums = realNums + imagNums[:, None] * 1j
-  escapeCounts = mandelbrot_numba_betterer2(complexNums, maxIterations)
-  return (realNums, imagNums, escapeCounts.T) 
\ No newline at end of file
+
+@guvectorize([(complex64[:], int32[:], int32[:]), (complex128[:], int32[:], int32[:])], '(n),()->(n)', target = 'parallel', cache = True)
+def mandelbrot_numba_betterer2_fast(c, maxIterations, output):
+  maxIterationsTemp = maxIterations[0]
+  for i in range(c.shape[0]):
+    output[i] = mandelbrot_numba_betterer3_fast(c[i], maxIterationsTemp)
+
+@guvectorize([(complex64[:], int32[:], float32[:]), (complex128[:], int32[:], float64[:])], '(n),()->(n)', target = 'parallel', cache = True)
+def mandelbrot_numba_betterer2_smooth(c, maxIterations, output):
+  maxIterationsTemp = maxIterations[0]
+  for i in range(c.shape[0]):
+    output[i] = mandelbrot_numba_betterer3_smooth(c[i], maxIterationsTemp)
+
+if clockNow is not None:
+  # The gufuncs above hand out one row at a time too; this does the same rows with (thread, start, end) per row, for
+  # instrument.py. Not cached (clockNow calls through a ctypes pointer), so the first instrumented call compiles it
+  @njit(parallel = True)
+  def mandelbrot_numba_betterer_timed(pixel, complexNums, maxIterations, escapeCounts, times):
+    for j in prange(complexNums.shape[0]):
+      timespec = np.empty(2, np.int64)
+      times[j, 0] = numba.get_thread_id()
+      times[j, 1] = clockNow(timespec)
+      for i in range(complexNums.shape[1]):
+        escapeCounts[j, i] = pixel(complexNums[j, i], maxIterations)
+      times[j, 2] = clockNow(timespec)
+
+@register('numba_betterer', np.float32, parallel = True, precisions = (np.float32, np.float64), outputs = (OUTPUT_COUNTS, OUTPUT_SMOOTH))
+def mandelbrot_set_numba_betterer(xMin, xMax, yMin, yMax, width, height, maxIterations, fast = False, precision = np.float32, output = OUTPUT_COUNTS):
+  checkMode(precision, output, fast)
+  realNums = np.linspace(xMin, xMax, width, dtype = precision)       # float64 holds up far deeper into a zoom than float32
+  imagNums = np.linspace(yMin, yMax, height, dtype = precision)
+  complexNums = realNums + imagNums[:, None] * 1j                    # complex64 or complex128 to match
+  if output == OUTPUT_SMOOTH:
+    kernel, pixel = mandelbrot_numba_betterer2_smooth, mandelbrot_numba_betterer3_smooth
+  elif fast:
+    kernel, pixel = mandelbrot_numba_betterer2_fast, mandelbrot_numba_betterer3_fast
+  else:
+    kernel, pixel = mandelbrot_numba_betterer2, mandelbrot_numba_betterer3
+  phase('kernel')
+  if instrumented() and clockNow is not None:
+    escapeCounts = np.empty((height, width), precision if output == OUTPUT_SMOOTH else np.int32)
+    times = np.empty((height, 3))
+    mandelbrot_numba_betterer_timed(pixel, complexNums, np.int32(maxIterations), escapeCounts, times)
+    reportChunks(times[:, 0], times[:, 1], times[:, 2])
+  else:
+    escapeCounts = kernel(complexNums, maxIterations)  # Already (height, width), the gufunc runs along each row
+  phase('post')
+  return (realNums, imagNums, escapeCounts)
\ No newline at end of file
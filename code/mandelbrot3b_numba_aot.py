@@ -0,0 +1,25 @@
+'''
+  Calculates the Mandelbrot set with the improved Numba kernel compiled ahead of time.
+
+  No JIT at all at run time: the row kernel is built once into a plain extension module (mandelbrot_aot) with
+  numba.pycc, so a fresh process goes straight from import to pixels. Build it next to this file with:
+    python build_aot.py
+  Until it is built this engine is simply reported as unavailable (see engines.py).
+  numba.pycc is deprecated upstream; the JIT engines with cache = True are the fallback and load nearly as fast warm.
+'''
+
+import numpy as np
+from engines import register, phase
+from mandelbrot_aot import mandelbrot_aot_rows
+
+@register('numba_aot', np.float64)
+def mandelbrot_set_numba_aot(xMin, xMax, yMin, yMax, width, height, maxIterations):
+  realNums = np.linspace(xMin, xMax, width)
+  imagNums = np.linspace(yMin, yMax, height)
+  xStep = (xMax - xMin) / (width  - 1) if width  > 1 else 0.0
+  yStep = (yMax - yMin) / (height - 1) if height > 1 else 0.0
+  escapeCounts = np.empty((height, width), np.int32)
+  phase('kernel')
+  mandelbrot_aot_rows(float(xMin), xStep, float(yMin), yStep, 0, maxIterations, escapeCounts)
+  phase('post')
+  return (realNums, imagNums, escapeCounts)
@@ -0,0 +1,147 @@
+'''
+  Calculates the Mandelbrot set with a SIMD-friendly Numba kernel.
+
+  mandelbrot_numba_betterer3 handles one complex pixel at a time and returns as soon as it escapes; that branch keeps
+  LLVM from vectorizing anything. Here real and imaginary parts are separate float32/float64 arrays (structure of
+  arrays) and a whole block of pixels - 32 float32 or 16 float64 - is iterated together:
+  every lane does the same arithmetic each step, lanes that escaped are frozen by a select (masked update) instead of
+  a branch, and the block only stops once every lane has escaped. The lane loop then compiles to vector instructions.
+  A block is two 512-bit registers (four AVX2 ones): LLVM interleaves the vector loop by two, so 16 float32 / 8 float64
+  lanes left it running the scalar remainder loop and were 1.3x / 3.6x slower (deep zoom, one core, AVX-512 machine).
+
+  Escape counts match mandelbrot_numba_better exactly in float64 (same arithmetic, same order).
+  Compared with the guvectorized kernel, on one core and on all of them: python mandelbrot3c_numba_simd.py
+'''
+
+import ctypes, time, numpy as np, numba
+from numba import njit, prange
+from engines import register, phase, instrumented, reportChunks, checkMode, OUTPUT_COUNTS
+
+_LANES = {np.dtype(np.float32): 32, np.dtype(np.float64): 16}  # Pixels per block: two 512-bit registers of either
+
+# Numba has no clock of its own, so per-row timings (instrument.py) call libc's clock_gettime through ctypes
+try:
+  clockGettime = ctypes.CDLL(None).clock_gettime
+  clockGettime.argtypes = [ctypes.c_int, ctypes.c_void_p]
+  clockGettime.restype = ctypes.c_int
+  _CLOCK = time.CLOCK_MONOTONIC                        # What time.perf_counter reads on Linux
+except (AttributeError, OSError, TypeError):
+  clockGettime = None                                  # Windows: no per-row timings
+
+clockNow = None                                        # Seconds on the perf_counter clock, from nopython code (also numba_betterer's)
+if clockGettime is not None:
+  @njit(nogil = True)
+  def clockNow(timespec):
+    clockGettime(_CLOCK, timespec.ctypes.data)
+    return timespec[0] + timespec[1] * 1e-9
+
+@njit(nogil = True, cache = True)
+def mandelbrot_numba_simd_block(cReal, cImag, maxIterations, bailout, zReal, zImag, alive, output):
+  lanes = cReal.shape[0]
+  for k in range(lanes):
+    zReal[k] = cReal[k] - cReal[k]                     # Zero in the input precision (no int literal to promote float32)
+    zImag[k] = zReal[k]
+    alive[k] = True
+    output[k] = 0
+  for n in range(maxIterations):
+    anyAlive = False
+    for k in range(lanes):                             # No branches in here: this is the loop that vectorizes
+      real = zReal[k]
+      imag = zImag[k]
+      realNew = real * real - imag * imag + cReal[k]
+      imagNew = (real + real) * imag + cImag[k]
+      escaped = realNew * realNew + imagNew * imagNew > bailout
+      live = alive[k]
+      zReal[k] = realNew if live else real             # Masked update: escaped lanes stay frozen (no overflow to inf)
+      zImag[k] = imagNew if live else imag
+      output[k] = n if live and escaped else output[k]
+      alive[k] = live and not escaped
+      anyAlive |= alive[k]
+    if not anyAlive:                                   # Block-level exit once every lane has escaped
+      break
+
+@njit(nogil = True, cache = True)
+def mandelbrot_numba_simd_row(realNums, imagNum, maxIterations, bailout, lanes, row):
+  width = realNums.shape[0]
+  cReal = np.empty(lanes, realNums.dtype)              # Per-row scratch: one block of coordinates and z, SoA
+  cImag = np.empty(lanes, realNums.dtype)
+  zReal = np.empty(lanes, realNums.dtype)
+  zImag = np.empty(lanes, realNums.dtype)
+  alive = np.empty(lanes, np.bool_)
+  output = np.empty(lanes, np.int32)
+  for b in range((width + lanes - 1) // lanes):
+    i0 = b * lanes
+    for k in range(lanes):
+      i = min(i0 + k, width - 1)                       # The last block is padded by repeating the last pixel
+      cReal[k] = realNums[i]
+      cImag[k] = imagNum
+    mandelbrot_numba_simd_block(cReal, cImag, maxIterations, bailout, zReal, zImag, alive, output)
+    for k in range(min(lanes, width - i0)):
+      row[i0 + k] = output[k]
+
+@njit(parallel = True, cache = True)
+def mandelbrot_numba_simd(realNums, imagNums, maxIterations, bailout, lanes, escapeCounts):
+  for j in prange(imagNums.shape[0]):
+    mandelbrot_numba_simd_row(realNums, imagNums[j], maxIterations, bailout, lanes, escapeCounts[j])
+
+if clockGettime is not None:
+  # Same loop, plus (thread, start, end) per row; only used while instrumenting. Not cached: Numba can't cache
+  # code that calls through a ctypes pointer, so the first instrumented call compiles it
+  @njit(parallel = True)
+  def mandelbrot_numba_simd_timed(realNums, imagNums, maxIterations, bailout, lanes, escapeCounts, times):
+    for j in prange(imagNums.shape[0]):
+      timespec = np.empty(2, np.int64)
+      times[j, 0] = numba.get_thread_id()
+      times[j, 1] = clockNow(timespec)
+      mandelbrot_numba_simd_row(realNums, imagNums[j], maxIterations, bailout, lanes, escapeCounts[j])
+      times[j, 2] = clockNow(timespec)
+
+@register('numba_simd', np.float32, parallel = True, precisions = (np.float32, np.float64))
+def mandelbrot_set_numba_simd(xMin, xMax, yMin, yMax, width, height, maxIterations, precision = np.float32, output = OUTPUT_COUNTS):
+  checkMode(precision, output)
+  if output != OUTPUT_COUNTS:
+    raise ValueError('numba_simd only returns escape counts')
+  precision = np.dtype(precision)
+  realNums = np.linspace(xMin, xMax, width, dtype = precision)
+  imagNums = np.linspace(yMin, yMax, height, dtype = precision)
+  escapeCounts = np.empty((height, width), np.int32)
+  phase('kernel')
+  if instrumented() and clockGettime is not None:
+    times = np.empty((height, 3))
+    mandelbrot_numba_simd_timed(realNums, imagNums, maxIterations, precision.type(4.0), _LANES[precision], escapeCounts, times)
+    reportChunks(times[:, 0], times[:, 1], times[:, 2])
+  else:
+    mandelbrot_numba_simd(realNums, imagNums, maxIterations, precision.type(4.0), _LANES[precision], escapeCounts)
+  phase('post')
+  return (realNums, imagNums, escapeCounts)
+
+# Single core first (the SIMD gain on its own), then every core (SIMD and threads together)
+if __name__ == '__main__':
+  import os, time, numba
+  from mandelbrot3a_numba_better import mandelbrot_set_numba_better
+  from mandelbrot3a_numba_betterer import mandelbrot_set_numba_betterer
+  views = {'full set': (-2.0, 0.5, -1.2, 1.2, 2000, 2000, 80),
+           'deep zoom': (-0.74877, -0.74872, 0.06505, 0.06510, 1000, 1000, 2048)}
+  runs = 5
+
+  def best(func, view, **kwargs):
+    func(*view[:4], 16, 16, view[6], **kwargs)         # JIT warm-up, not timed
+    times = []
+    for _ in range(runs):
+      start = time.perf_counter()
+      func(*view, **kwargs)
+      times.append(time.perf_counter() - start)
+    return min(times)
+
+  view = views['deep zoom']
+  assert np.array_equal(mandelbrot_set_numba_simd(*view, precision = np.float64)[2], mandelbrot_set_numba_better(*view)[2])
+
+  for threads in sorted({1, os.cpu_count() or 1}):
+    numba.set_num_threads(threads)
+    print(str(threads) + (' core' if threads == 1 else ' cores'))
+    for viewName, view in views.items():
+      for precision in (np.float32, np.float64):
+        simd = best(mandelbrot_set_numba_simd, view, precision = precision)
+        betterer = best(mandelbrot_set_numba_betterer, view, precision = precision)
+        print('  ' + viewName + '\t' + np.dtype(precision).name + '\tSIMD blocks ' + '%.4f' % simd + 's\tBetterer Numba '
+              + '%.4f' % betterer + 's\t' + '%.2f' % (betterer / simd) + 'x')
@@ -6,9 +6,10 @@
 '''
 
 import numpy as np, numexpr as ne
+from engines import register, phase
 
 def mandelbrot_numexpr(c, maxIterations):
-  escapeCount = np.zeros(c.shape)
+  escapeCount = np.zeros(c.shape, np.int32)
   z = np.zeros(c.shape, np.complex64)
 
   for iteration in range(maxIterations):
@@ -19,10 +20,13 @@ def mandelbrot_numexpr(c, maxIterations):
   escapeCount[escapeCount == maxIterations - 1] = 0    
   return escapeCount
 
+@register('numexpr', np.float32, parallel = True)  # ne.evaluate splits every expression across its own thread pool
 def mandelbrot_set_numexpr(xMin, xMax, yMin, yMax, width, height, maxIterations):
   realNums = np.linspace(xMin, xMax, width, dtype = np.float32)   # No great significance with explicit datatypes
   imagNums = np.linspace(yMin, yMax, height, dtype = np.float32)  # Maybe a 1% increase in speed
   complexNums  = np.ravel(realNums + imagNums[:,None] * 1j)
+  phase('kernel')
   escapeCounts  = mandelbrot_numexpr(complexNums, maxIterations)
-  escapeCounts  = escapeCounts.reshape((width, height))
-  return (realNums, imagNums, escapeCounts.T)
\ No newline at end of file
+  phase('post')
+  escapeCounts  = escapeCounts.reshape((height, width))
+  return (realNums, imagNums, escapeCounts)
\ No newline at end of file
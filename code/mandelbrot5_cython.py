@@ -3,12 +3,55 @@
   @date:   Fall 2022
 
   See c_mandelbrot.pyx
-  Built with CythonBuilder in Windows
+  Built with CythonBuilder in Windows; on Linux: python setup.py build_ext --inplace (OpenMP, see setup.py)
 
-  Calculates the Mandelbrot set using Numba. Blazing fast!
+  Calculates the Mandelbrot set using Cython. Blazing fast!
+
+  Rows are spread over OpenMP threads (prange, nogil). threads = 0 leaves the count to OMP_NUM_THREADS / every core.
+  out = an existing C-contiguous (height, width) array to write into instead of allocating one.
+  While instrumenting (instrument.py) every row's thread and start/end time are recorded too.
+
+  Compared with Betterer Numba at 1..cpu_count threads: python mandelbrot5_cython.py
 '''
 
+import numpy as np
+from engines import register, phase, instrumented, reportChunks, checkMode, OUTPUT_COUNTS, OUTPUT_SMOOTH
 from c_mandelbrot import mandelbrot_set_cython_func
 
-def mandelbrot_set_cython(xMin, xMax, yMin, yMax, width, height, maxIterations):
-  return mandelbrot_set_cython_func(xMin, xMax, yMin, yMax, width, height, maxIterations)
\ No newline at end of file
+@register('cython', np.float64, parallel = True, precisions = (np.float32, np.float64), outputs = (OUTPUT_COUNTS, OUTPUT_SMOOTH))
+def mandelbrot_set_cython(xMin, xMax, yMin, yMax, width, height, maxIterations, fast = False, precision = np.float64, output = OUTPUT_COUNTS,
+                          out = None, threads = 0):
+  checkMode(precision, output, fast)
+  if not instrumented():
+    return mandelbrot_set_cython_func(xMin, xMax, yMin, yMax, width, height, maxIterations, fast, precision, output, out, threads)
+  times = np.empty((height, 3))                        # (thread, start, end) per row, on OpenMP's clock
+  phase('kernel')                                      # Grids are built inside the extension: counted as kernel
+  result = mandelbrot_set_cython_func(xMin, xMax, yMin, yMax, width, height, maxIterations, fast, precision, output, out, threads, times)
+  phase('post')
+  reportChunks(times[:, 0], times[:, 1], times[:, 2])
+  return result
+
+if __name__ == '__main__':
+  import os, time, numba
+  from mandelbrot3a_numba_betterer import mandelbrot_set_numba_betterer
+  views = {'full set': (-2.0, 0.5, -1.2, 1.2, 2000, 2000, 80),
+           'deep zoom': (-0.74877, -0.74872, 0.06505, 0.06510, 1000, 1000, 2048)}
+  runs = 5
+
+  def best(func, view, **kwargs):
+    func(*view[:4], 16, 16, view[6], **kwargs)         # JIT warm-up, not timed
+    times = []
+    for _ in range(runs):
+      start = time.perf_counter()
+      func(*view, **kwargs)
+      times.append(time.perf_counter() - start)
+    return min(times)
+
+  for viewName, view in views.items():
+    print(viewName, view[4], 'x', view[5], ':', view[6], 'iterations')
+    for threads in range(1, (os.cpu_count() or 1) + 1):
+      numba.set_num_threads(threads)
+      for precision in (np.float32, np.float64):
+        cython = best(mandelbrot_set_cython, view, precision = precision, threads = threads)
+        betterer = best(mandelbrot_set_numba_betterer, view, precision = precision)
+        print('  ' + str(threads) + ' threads\t' + np.dtype(precision).name + '\tCython ' + '%.4f' % cython + 's\tBetterer Numba ' + '%.4f' % betterer + 's')
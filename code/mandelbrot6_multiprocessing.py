@@ -2,50 +2,130 @@
   @author: Tyler Procko
   @date:   Fall 2022
 
-  Calculates the Mandelbrot set using multiprocessing. 
+  Calculates the Mandelbrot set using multiprocessing.
 
-  NOTE: this code is not part of the regular testing suite, so its timings should be taken with a grain of salt.
-  This is because there are no across-file calls like all the other optimization techniques, so it has a "head start".
-  Here, we have our own main method to let the pools work without error, or repeatedly calling the other main.
-  Still, the input values are the same as the others and we see that this is actually pretty fast.
+  One persistent Pool (forkserver/spawn) is shared by every call and closed at exit. Workers are handed row ranges, run the compiled
+  Numba row kernel on them and write the escape counts straight into a multiprocessing.shared_memory int32 buffer,
+  so nothing but the (row0, row1) ranges goes through pickle. Chunks are guided: big while there is plenty of work
+  left and shrinking towards the end, so the expensive rows through the cardioid don't leave one worker straggling.
+  Calls from several threads take turns on the one buffer (and the pool, which already has every core busy).
+
+  Running this file on its own does the old increasing-load test.
 '''
 
-import time, numpy as np
-from matplotlib      import pyplot
-from multiprocessing import Pool
-
-xMin, xMax    = -2.0, 0.5
-yMin, yMax    = -1.2, 1.2
-width, height =  1000,1000
-maxIterations =  80         # map can only take one argument so we set this globally
-loadIncrease  =  .2
-loadTimes     =  20 
-
-# Pretty much identical to the pure Python code
-def mandelbrot(c): 
-  z = 0
-  for n in range(maxIterations):
-    if abs(z) > 2:  # Pythagorean theorem trick has no effect here
-      return n  
-    z = z * z + c
-  return maxIterations
+import atexit, math, os, threading, time, numpy as np, multiprocessing
+from multiprocessing import shared_memory, resource_tracker
+from engines import register, phase, reportChunks
+from mandelbrot3a_numba_better import mandelbrot_numba_better_rows
+
+_MIN_CHUNK_ROWS = 4    # Smallest chunk handed to a worker
+_CHUNK_FACTOR   = 2    # Chunk = remaining rows / (_CHUNK_FACTOR * processes)
+
+_pool      = None       # Persistent pool, created on first use
+_processes = 0          # Its size
+_shared    = None       # Persistent shared output buffer, grown as needed
+_lock      = threading.Lock()  # Held from claiming _shared to copying out of it: one frame in the buffer at a time
+_attached  = None       # (Worker side) the shared buffer this worker currently has open
+
+def _warmUp():
+  mandelbrot_numba_better_rows(0.0, 0.0, 0.0, 0.0, 0, 1, np.empty((1, 1), np.int32))  # JIT compile once per worker, up front
+
+def getPool(processes = None):
+  global _pool, _processes
+  if _pool is None:
+    # Never plain fork: forking after Numba's parallel backends have started their threads (TBB) hangs the workers
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+    _processes = processes or os.cpu_count()
+    _pool = context.Pool(_processes, initializer = _warmUp)
+  return _pool
+
+def _sharedBuffer(nbytes):
+  global _shared
+  if _shared is None or _shared.size < nbytes:
+    if _shared is not None:
+      _shared.close()
+      _shared.unlink()
+    _shared = shared_memory.SharedMemory(create = True, size = max(nbytes, 1))
+  return _shared
+
+@atexit.register
+def closePool():
+  global _pool, _shared
+  if _pool is not None:
+    _pool.close()
+    _pool.join()
+    _pool = None
+  if _shared is not None:
+    _shared.close()
+    _shared.unlink()
+    _shared = None
+
+def chunkRows(height, processes):
+  '''Guided schedule: list of (row0, row1) ranges that shrink as the remaining work does.'''
+  chunks = []
+  row0 = 0
+  while row0 < height:
+    rows = max(_MIN_CHUNK_ROWS, math.ceil((height - row0) / (_CHUNK_FACTOR * processes)))
+    chunks.append((row0, min(row0 + rows, height)))
+    row0 += rows
+  return chunks
+
+def _attach(name):
+  try:
+    return shared_memory.SharedMemory(name = name, track = False)     # Python 3.13+
+  except TypeError:
+    register = resource_tracker.register                              # Older Pythons track attachments too, but only the
+    resource_tracker.register = lambda name, rtype: None              # creator should own (and unlink) the buffer
+    try:
+      return shared_memory.SharedMemory(name = name)
+    finally:
+      resource_tracker.register = register
+
+def mandelbrot_multiprocessing(task):
+  global _attached
+  name, width, height, xMin, xStep, yMin, yStep, maxIterations, row0, row1 = task
+  if _attached is None or _attached.name != name:      # Attach once per buffer, not once per chunk
+    if _attached is not None:
+      _attached.close()
+    _attached = _attach(name)
+  escapeCounts = np.ndarray((height, width), np.int32, buffer = _attached.buf)
+  start = time.perf_counter()
+  mandelbrot_numba_better_rows(xMin, xStep, yMin, yStep, row0, maxIterations, escapeCounts[row0:row1])
+  end = time.perf_counter()
+  del escapeCounts                                     # Drop the view so the buffer can be closed later
+  return (os.getpid(), start, end)                     # Who ran the chunk and when, for reportChunks
+
+@register('multiprocessing', np.float64, parallel = True)
+def mandelbrot_set_multiprocessing(xMin, xMax, yMin, yMax, width, height, maxIterations):
+  realNums = np.linspace(xMin, xMax, width)
+  imagNums = np.linspace(yMin, yMax, height)
+  xStep = (xMax - xMin) / (width  - 1) if width  > 1 else 0.0
+  yStep = (yMax - yMin) / (height - 1) if height > 1 else 0.0
+
+  with _lock:                                          # Calls from several threads (tile server, zoom pipeline) take turns
+    pool = getPool()
+    shared = _sharedBuffer(width * height * 4)
+    tasks = [(shared.name, width, height, xMin, xStep, yMin, yStep, maxIterations, row0, row1)
+             for row0, row1 in chunkRows(height, _processes)]
+    phase('kernel')
+    chunks = list(pool.imap_unordered(mandelbrot_multiprocessing, tasks))
+    reportChunks(*zip(*chunks))
+    phase('post')
+    # One memcpy out of the shared buffer (it gets reused by the next call)
+    escapeCounts = np.ndarray((height, width), np.int32, buffer = shared.buf).copy()
+  return (realNums, imagNums, escapeCounts)
 
 if __name__ == '__main__':
-  for i in range (loadTimes):
+  width, height = 1000, 1000
+  maxIterations = 80
+  loadIncrease  = .2
+  loadTimes     = 20
+  for i in range(loadTimes):
     print(width, 'x', height, ':', maxIterations, 'iterations')
     time1 = time.time()
-    realNums = np.linspace(xMin, xMax, width)
-    imagNums = np.linspace(yMin, yMax, height)
-
-    p = Pool()
-    complexNums = [complex(real, imag) for imag in imagNums for real in realNums] 
-    escapeCounts = p.map(mandelbrot, complexNums)                                  
-    escapeCounts = np.reshape(escapeCounts, (width, height))    
+    mandelbrot_set_multiprocessing(-2.0, 0.5, -1.2, 1.2, width, height, maxIterations)
     print(str(time.time() - time1))
-
-    #pyplot.imshow(escapeCounts) 
-    #pyplot.show()
-
     width         += int(width         * loadIncrease)
     height        += int(height        * loadIncrease)
     maxIterations += int(maxIterations * loadIncrease)
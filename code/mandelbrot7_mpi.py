@@ -2,13 +2,139 @@
   @author: Tyler Procko
   @date:   Fall 2022
 
-  TODO TODO TODO
+  Calculates the Mandelbrot set using MPI (mpi4py).
 
-  Ran out of time for this project.
+  Rank 0 is a master that hands out blocks of rows on demand; every other rank is a worker that asks for a block,
+  computes it and sends it straight back into the master's int32 output buffer (no pickled lists).
+  Static slicing is badly imbalanced here: rows through the main cardioid run all maxIterations while rows near the
+  top and bottom of the frame escape in a few steps. The static schedule (one Gatherv) is kept for comparison.
+
+  Every rank must call mandelbrot_set_mpi; only rank 0 gets the escape counts back, the rest get None.
+  Run on its own (one rank) it simply computes everything locally.
+
+  Scaling harness, on one Linux box:
+    mpirun -n 4 python mandelbrot7_mpi.py --width 2000 --height 2000 --iterations 256 --schedule dynamic
 '''
 
-def mandelbrot_mpi():
-  return 0
-  
+import argparse, time, numpy as np
+from mpi4py import MPI
+from engines import register, phase
+from mandelbrot3a_numba_better import mandelbrot_numba_better_rows as mandelbrot_mpi  # Coordinates from the row index, so workers never need the full grid
+
+_BLOCK_ROWS = 16  # Rows per work unit for the dynamic schedule
+
+_TAG_READY  = 1   # Worker -> master: give me work (first message)
+_TAG_RESULT = 2   # Worker -> master: here is my finished block, give me more
+_TAG_WORK   = 3   # Master -> worker: [row0, row1]
+_TAG_STOP   = 4   # Master -> worker: nothing left
+
+def _master(comm, escapeCounts, blockRows):
+  height = escapeCounts.shape[0]
+  nextRow = 0
+  assigned = {}                                    # Worker rank -> row0 of the block it is working on
+  active = comm.Get_size() - 1
+  status = MPI.Status()
+  while active:
+    comm.Probe(source = MPI.ANY_SOURCE, tag = MPI.ANY_TAG, status = status)
+    source = status.Get_source()
+    if status.Get_tag() == _TAG_RESULT:
+      row0 = assigned.pop(source)
+      rows = status.Get_count(MPI.INT) // escapeCounts.shape[1]
+      comm.Recv([escapeCounts[row0:row0 + rows], MPI.INT], source = source, tag = _TAG_RESULT)  # Lands in place
+    else:
+      comm.Recv([np.empty(0, np.int32), MPI.INT], source = source, tag = _TAG_READY)
+    if nextRow < height:
+      block = np.array([nextRow, min(nextRow + blockRows, height)], np.int32)
+      assigned[source] = nextRow
+      nextRow = block[1]
+      comm.Send([block, MPI.INT], dest = source, tag = _TAG_WORK)
+    else:
+      comm.Send([np.empty(0, np.int32), MPI.INT], dest = source, tag = _TAG_STOP)
+      active -= 1
+
+def _worker(comm, xMin, xStep, yMin, yStep, width, blockRows, maxIterations):
+  buffer = np.empty((blockRows, width), np.int32)  # Reused for every block
+  block = np.empty(2, np.int32)
+  status = MPI.Status()
+  comm.Send([np.empty(0, np.int32), MPI.INT], dest = 0, tag = _TAG_READY)
+  busy = 0.0
+  while True:
+    comm.Recv([block, MPI.INT], source = 0, tag = MPI.ANY_TAG, status = status)
+    if status.Get_tag() == _TAG_STOP:
+      return busy
+    start = time.perf_counter()
+    rows = buffer[:block[1] - block[0]]
+    mandelbrot_mpi(xMin, xStep, yMin, yStep, int(block[0]), maxIterations, rows)
+    busy += time.perf_counter() - start
+    comm.Send([rows, MPI.INT], dest = 0, tag = _TAG_RESULT)
+
+def _static(comm, xMin, xStep, yMin, yStep, width, height, maxIterations, escapeCounts):
+  rank, size = comm.Get_rank(), comm.Get_size()
+  counts = [(height // size + (r < height % size)) for r in range(size)]  # Contiguous row slices
+  row0 = sum(counts[:rank])
+  rows = np.empty((counts[rank], width), np.int32)
+  start = time.perf_counter()
+  mandelbrot_mpi(xMin, xStep, yMin, yStep, row0, maxIterations, rows)
+  busy = time.perf_counter() - start
+  sizes = [c * width for c in counts]
+  recv = [escapeCounts, (sizes, [sum(sizes[:r]) for r in range(size)]), MPI.INT] if rank == 0 else None
+  comm.Gatherv([rows, MPI.INT], recv, root = 0)
+  return busy
+
+def run_mpi(xMin, xMax, yMin, yMax, width, height, maxIterations, comm = None, schedule = 'dynamic', blockRows = _BLOCK_ROWS):
+  '''Collective: returns (realNums, imagNums, escapeCounts or None, seconds this rank spent computing).'''
+  comm = MPI.COMM_WORLD if comm is None else comm
+  rank, size = comm.Get_rank(), comm.Get_size()
+  realNums = np.linspace(xMin, xMax, width)
+  imagNums = np.linspace(yMin, yMax, height)
+  xStep = (xMax - xMin) / (width  - 1) if width  > 1 else 0.0
+  yStep = (yMax - yMin) / (height - 1) if height > 1 else 0.0
+  escapeCounts = np.empty((height, width), np.int32) if rank == 0 else None
+
+  phase('kernel')
+  if size == 1:
+    start = time.perf_counter()
+    mandelbrot_mpi(xMin, xStep, yMin, yStep, 0, maxIterations, escapeCounts)
+    busy = time.perf_counter() - start
+  elif schedule == 'static':
+    busy = _static(comm, xMin, xStep, yMin, yStep, width, height, maxIterations, escapeCounts)
+  elif rank == 0:
+    _master(comm, escapeCounts, blockRows)
+    busy = 0.0
+  else:
+    busy = _worker(comm, xMin, xStep, yMin, yStep, width, blockRows, maxIterations)
+  phase('post')
+  return (realNums, imagNums, escapeCounts, busy)
+
+@register('mpi', np.float64, parallel = True)
 def mandelbrot_set_mpi(xMin, xMax, yMin, yMax, width, height, maxIterations):
-  return 0
\ No newline at end of file
+  return run_mpi(xMin, xMax, yMin, yMax, width, height, maxIterations)[:3]
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description = 'MPI scaling harness, launch with mpirun -n N')
+  parser.add_argument('--width',      type = int,   default = 1000)
+  parser.add_argument('--height',     type = int,   default = 1000)
+  parser.add_argument('--iterations', type = int,   default = 80)
+  parser.add_argument('--schedule',   choices = ['dynamic', 'static'], default = 'dynamic')
+  parser.add_argument('--block-rows', type = int,   default = _BLOCK_ROWS)
+  parser.add_argument('--runs',       type = int,   default = 5)
+  args = parser.parse_args()
+
+  comm = MPI.COMM_WORLD
+  view = (-2.0, 0.5, -1.2, 1.2, args.width, args.height, args.iterations)
+  mandelbrot_mpi(-2.0, 0.1, -1.2, 0.1, 0, args.iterations, np.empty((2, 2), np.int32))  # JIT warm-up on every rank (not every rank gets a block of a tiny frame)
+
+  times = []
+  for _ in range(args.runs):
+    comm.Barrier()
+    start = MPI.Wtime()
+    busy = run_mpi(*view, comm, args.schedule, args.block_rows)[3]
+    comm.Barrier()
+    times.append(MPI.Wtime() - start)
+  busyAll = comm.gather(busy, root = 0)
+  if comm.Get_rank() == 0:
+    workers = busyAll[1:] if comm.Get_size() > 1 and args.schedule == 'dynamic' else busyAll
+    print(args.width, 'x', args.height, ':', args.iterations, 'iterations,', comm.Get_size(), 'ranks,', args.schedule)
+    print('best', str(min(times)) + 's', 'mean', str(sum(times) / len(times)) + 's')
+    print('busy per rank (last run):', ' '.join('%.4f' % b for b in busyAll))
+    print('imbalance (max / mean busy):', '%.3f' % (max(workers) / (sum(workers) / len(workers))))
@@ -0,0 +1,114 @@
+'''
+  Calculates the Mandelbrot set with Mariani-Silver rectangle subdivision (border tracing).
+
+  The Mandelbrot set is connected, so if every pixel on a rectangle's border has the same escape count the
+  inside almost always does too and can be filled without iterating. Only borders get computed; rectangles
+  with mixed borders are split in two and checked again, down to _MIN_SIZE where they are just brute-forced.
+  The frame is cut into _TILE_SIZE tiles up front and the tiles are subdivided in parallel (prange).
+
+  "Almost always": a filament thinner than a pixel can sneak between two border samples, so check = True
+  compares against the brute-force mandelbrot_set_numba_better output and fails loudly if anything differs.
+'''
+
+import numpy as np
+from numba import njit, prange
+from engines import register, phase
+from mandelbrot3a_numba_better import mandelbrot_numba_better, mandelbrot_set_numba_better
+
+_TILE_SIZE = 128  # Top-level tiles, one parallel work unit each
+_MIN_SIZE  = 4    # Rectangles this thin are brute-forced instead of split again
+
+@njit(nogil = True, cache = True)
+def _pixel(realNums, imagNums, maxIterations, escapeCounts, j, i):
+  # -1 means not computed yet; neighbouring rectangles share borders, so each pixel is only iterated once
+  if escapeCounts[j, i] < 0:
+    escapeCounts[j, i] = mandelbrot_numba_better(realNums[i], imagNums[j], maxIterations)
+    return escapeCounts[j, i], 1
+  return escapeCounts[j, i], 0
+
+@njit(nogil = True, cache = True)
+def mandelbrot_mariani_silver(realNums, imagNums, maxIterations, escapeCounts, row0, row1, col0, col1, minSize):
+  calls = 0
+  stack = [(row0, row1, col0, col1)]  # Inclusive bounds
+  while len(stack) > 0:
+    r0, r1, c0, c1 = stack.pop()
+    value, called = _pixel(realNums, imagNums, maxIterations, escapeCounts, r0, c0)
+    calls += called
+    uniform = True
+    for i in range(c0, c1 + 1):
+      top, called = _pixel(realNums, imagNums, maxIterations, escapeCounts, r0, i)
+      calls += called
+      bottom, called = _pixel(realNums, imagNums, maxIterations, escapeCounts, r1, i)
+      calls += called
+      uniform = uniform and top == value and bottom == value
+    for j in range(r0 + 1, r1):
+      left, called = _pixel(realNums, imagNums, maxIterations, escapeCounts, j, c0)
+      calls += called
+      right, called = _pixel(realNums, imagNums, maxIterations, escapeCounts, j, c1)
+      calls += called
+      uniform = uniform and left == value and right == value
+
+    if uniform:
+      escapeCounts[r0 + 1:r1, c0 + 1:c1] = value      # Flood fill, no iterating
+    elif r1 - r0 <= minSize or c1 - c0 <= minSize:
+      for j in range(r0 + 1, r1):
+        for i in range(c0 + 1, c1):
+          _, called = _pixel(realNums, imagNums, maxIterations, escapeCounts, j, i)
+          calls += called
+    elif r1 - r0 > c1 - c0:                           # Split the longer side; the halves share the middle line
+      middle = (r0 + r1) // 2
+      stack.append((r0, middle, c0, c1))
+      stack.append((middle, r1, c0, c1))
+    else:
+      middle = (c0 + c1) // 2
+      stack.append((r0, r1, c0, middle))
+      stack.append((r0, r1, middle, c1))
+  return calls
+
+@njit(parallel = True, cache = True)
+def mandelbrot_mariani_silver_tiles(realNums, imagNums, maxIterations, escapeCounts, tileSize, minSize):
+  height, width = escapeCounts.shape
+  tilesY = max(1, (height - 1 + tileSize - 1) // tileSize)
+  tilesX = max(1, (width  - 1 + tileSize - 1) // tileSize)
+  calls = np.zeros(tilesY * tilesX, np.int64)
+  for t in prange(tilesY * tilesX):
+    row0 = (t // tilesX) * tileSize
+    col0 = (t %  tilesX) * tileSize
+    # Tiles share their edge rows/columns; if two threads race on one it's the same value written twice
+    calls[t] = mandelbrot_mariani_silver(realNums, imagNums, maxIterations, escapeCounts,
+                                         row0, min(row0 + tileSize, height - 1), col0, min(col0 + tileSize, width - 1), minSize)
+  return calls.sum()
+
+def render_mariani_silver(xMin, xMax, yMin, yMax, width, height, maxIterations, check = False, tileSize = _TILE_SIZE, minSize = _MIN_SIZE):
+  '''Returns (realNums, imagNums, escapeCounts, kernelCalls).'''
+  realNums = np.linspace(xMin, xMax, width)   # Same float64 grid as mandelbrot_set_numba_better
+  imagNums = np.linspace(yMin, yMax, height)
+  escapeCounts = np.full((height, width), -1, np.int32)
+  phase('kernel')
+  kernelCalls = mandelbrot_mariani_silver_tiles(realNums, imagNums, maxIterations, escapeCounts, tileSize, minSize)
+  phase('post')
+  if check:
+    bruteForce = mandelbrot_set_numba_better(xMin, xMax, yMin, yMax, width, height, maxIterations)[2]
+    wrong = np.count_nonzero(bruteForce != escapeCounts)
+    if wrong:                                 # Not an assert: check = True has to check under python -O too
+      raise AssertionError(str(wrong) + ' pixels differ from the brute-force output')
+  return (realNums, imagNums, escapeCounts, kernelCalls)
+
+@register('mariani_silver', np.float64, parallel = True)
+def mandelbrot_set_mariani_silver(xMin, xMax, yMin, yMax, width, height, maxIterations):
+  return render_mariani_silver(xMin, xMax, yMin, yMax, width, height, maxIterations)[:3]
+
+if __name__ == '__main__':
+  import time
+  views = {'full set': (-2.0, 0.5, -1.2, 1.2, 1000, 1000, 80),
+           'deep zoom': (-0.74877, -0.74872, 0.06505, 0.06510, 1000, 1000, 2048)}
+  for name, view in views.items():
+    render_mariani_silver(*view[:4], 8, 8, 8)                 # JIT warm-up
+    mandelbrot_set_numba_better(*view[:4], 8, 8, 8)
+    time1 = time.perf_counter()
+    _, _, escapeCounts, kernelCalls = render_mariani_silver(*view)
+    time2 = time.perf_counter()
+    bruteForce = mandelbrot_set_numba_better(*view)[2]
+    time3 = time.perf_counter()
+    print(name + '\t\t' + str(kernelCalls) + ' kernel calls (' + str(round(view[4] * view[5] / kernelCalls, 1)) + 'x fewer), '
+          + str(np.count_nonzero(bruteForce != escapeCounts)) + ' pixels differ\t' + str(time2 - time1) + 's vs brute force ' + str(time3 - time2) + 's')
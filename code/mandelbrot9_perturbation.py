@@ -0,0 +1,151 @@
+'''
+  Calculates the Mandelbrot set at deep zoom with perturbation theory.
+
+  Past about 1e-13 of view width float64 can no longer tell neighbouring pixels apart. Instead of giving every
+  pixel arbitrary precision, one reference orbit Z is computed at the centre of the frame in arbitrary precision
+  (mpmath, or the standard library's decimal when mpmath isn't installed). Every pixel then only iterates its
+  small difference from that orbit, dz, in plain float64 inside a parallel Numba kernel:
+
+    dz(n+1) = 2 Z(n) dz(n) + dz(n)^2 + dc        and the pixel's own z = Z(n+1) + dz(n+1)
+
+  Glitches (the pixel's orbit drifting away from the reference so dz stops being small) are caught when
+  |z| < |dz|, and the pixel is rebased onto the start of the reference orbit (dz = z, back to Z(0) = 0).
+  The same happens when a pixel outlives the reference orbit (the centre escaped first).
+
+  Bounds can be given as strings so no precision is lost before the reference orbit is built, e.g.
+    mandelbrot_set_perturbation('-0.7436438870371587047521915061148', '-0.7436438870371587047521915061138', ...)
+  Deltas are plain float64, so zooms deeper than ~1e-300 would also need an extended exponent.
+'''
+
+import numpy as np
+from numba import njit, prange
+from engines import register, phase
+
+try:
+  import mpmath
+except ImportError:
+  mpmath = None
+import decimal
+
+_GUARD_DIGITS = 20  # Extra decimal digits of precision on top of what the zoom depth needs
+
+def _digits(*bounds):
+  '''Decimal digits needed to resolve the view: depth of the zoom plus guard digits.'''
+  width = min(abs(float(decimal.Decimal(str(b1)) - decimal.Decimal(str(b0)))) or 1.0 for b0, b1 in bounds)
+  return max(17, int(-np.log10(width)) + _GUARD_DIGITS)
+
+def referenceOrbit(centerReal, centerImag, maxIterations, digits):
+  '''Z(0) = 0 ... Z(K) at the centre, in arbitrary precision, rounded to float64. Stops early if the centre escapes.'''
+  orbitReal = np.zeros(maxIterations + 1)
+  orbitImag = np.zeros(maxIterations + 1)
+  if mpmath is not None:
+    with mpmath.workdps(digits):
+      c = mpmath.mpc(mpmath.mpf(centerReal), mpmath.mpf(centerImag))
+      z = mpmath.mpc(0)
+      for n in range(1, maxIterations + 1):
+        z = z * z + c
+        orbitReal[n], orbitImag[n] = float(z.real), float(z.imag)
+        if orbitReal[n] * orbitReal[n] + orbitImag[n] * orbitImag[n] > 4.0:
+          return orbitReal[:n + 1], orbitImag[:n + 1]
+  else:
+    context = decimal.Context(prec = digits)
+    cReal, cImag = context.create_decimal(centerReal), context.create_decimal(centerImag)
+    real = imag = context.create_decimal(0)
+    for n in range(1, maxIterations + 1):
+      real, imag = context.add(context.subtract(context.multiply(real, real), context.multiply(imag, imag)), cReal), \
+                   context.add(context.multiply(context.multiply(real, imag), 2), cImag)
+      orbitReal[n], orbitImag[n] = float(real), float(imag)
+      if orbitReal[n] * orbitReal[n] + orbitImag[n] * orbitImag[n] > 4.0:
+        return orbitReal[:n + 1], orbitImag[:n + 1]
+  return orbitReal, orbitImag
+
+def pixelDeltas(low, high, count, center, digits):
+  '''Offsets of each pixel from the centre, worked out in high precision and only then rounded to float64.'''
+  context = decimal.Context(prec = digits)
+  low, high, center = context.create_decimal(str(low)), context.create_decimal(str(high)), context.create_decimal(center)
+  step = context.divide(context.subtract(high, low), max(count - 1, 1))
+  start = context.subtract(low, center)
+  return np.array([float(context.add(start, context.multiply(step, i))) for i in range(count)])
+
+@njit(nogil = True, cache = True)
+def mandelbrot_perturbation(deltaReal, deltaImag, orbitReal, orbitImag, maxIterations):
+  last = orbitReal.shape[0] - 1
+  dzReal = 0.0
+  dzImag = 0.0
+  m = 0                                  # Where this pixel currently is along the reference orbit
+  rebases = 0
+  for n in range(maxIterations):
+    zr = orbitReal[m]
+    zi = orbitImag[m]
+    dzRealNew = 2.0 * (zr * dzReal - zi * dzImag) + dzReal * dzReal - dzImag * dzImag + deltaReal
+    dzImag    = 2.0 * (zr * dzImag + zi * dzReal) + 2.0 * dzReal * dzImag + deltaImag
+    dzReal    = dzRealNew
+    m += 1
+    real = orbitReal[m] + dzReal         # The pixel's actual z
+    imag = orbitImag[m] + dzImag
+    magnitude = real * real + imag * imag
+    if magnitude > 4.0:
+      return n, rebases
+    if magnitude < dzReal * dzReal + dzImag * dzImag or m == last:
+      dzReal = real                      # Glitch (or ran off the end of the reference): rebase onto Z(0) = 0
+      dzImag = imag
+      m = 0
+      rebases += 1
+  return 0, rebases
+
+@njit(parallel = True, cache = True)
+def mandelbrot_perturbation_rows(deltaReals, deltaImags, orbitReal, orbitImag, maxIterations, escapeCounts):
+  rebases = np.zeros(deltaImags.shape[0], np.int64)
+  for j in prange(deltaImags.shape[0]):
+    for i in range(deltaReals.shape[0]):
+      escapeCounts[j, i], rebased = mandelbrot_perturbation(deltaReals[i], deltaImags[j], orbitReal, orbitImag, maxIterations)
+      rebases[j] += rebased
+  return rebases.sum()
+
+def render_perturbation(xMin, xMax, yMin, yMax, width, height, maxIterations):
+  '''Returns (realNums, imagNums, escapeCounts, rebases); bounds may be strings.'''
+  digits = _digits((xMin, xMax), (yMin, yMax))
+  context = decimal.Context(prec = digits)
+  centerReal = str(context.divide(context.add(decimal.Decimal(str(xMin)), decimal.Decimal(str(xMax))), 2))
+  centerImag = str(context.divide(context.add(decimal.Decimal(str(yMin)), decimal.Decimal(str(yMax))), 2))
+
+  orbitReal, orbitImag = referenceOrbit(centerReal, centerImag, maxIterations, digits)
+  deltaReals = pixelDeltas(xMin, xMax, width,  centerReal, digits)
+  deltaImags = pixelDeltas(yMin, yMax, height, centerImag, digits)
+  escapeCounts = np.empty((height, width), np.int32)
+  phase('kernel')                                 # The reference orbit above is the setup
+  rebases = mandelbrot_perturbation_rows(deltaReals, deltaImags, orbitReal, orbitImag, maxIterations, escapeCounts)
+  phase('post')
+  # Coordinates as float64 for the caller; at this depth they can't be told apart, the deltas are what matter
+  return (float(xMin) + deltaReals - deltaReals[0], float(yMin) + deltaImags - deltaImags[0], escapeCounts, rebases)
+
+@register('perturbation', np.float64, parallel = True)
+def mandelbrot_set_perturbation(xMin, xMax, yMin, yMax, width, height, maxIterations):
+  return render_perturbation(xMin, xMax, yMin, yMax, width, height, maxIterations)[:3]
+
+def view(centerReal, centerImag, scale, aspect = 1.0):
+  '''(xMin, xMax, yMin, yMax) as exact strings for a centre and a view width, all given as strings.'''
+  context = decimal.Context(prec = max(50, len(centerReal) + len(centerImag) + len(scale)))
+  half = context.divide(decimal.Decimal(scale), 2)
+  halfHeight = context.multiply(half, decimal.Decimal(str(aspect)))
+  centerReal, centerImag = decimal.Decimal(centerReal), decimal.Decimal(centerImag)
+  return (str(context.subtract(centerReal, half)), str(context.add(centerReal, half)),
+          str(context.subtract(centerImag, halfHeight)), str(context.add(centerImag, halfHeight)))
+
+if __name__ == '__main__':
+  import time
+  from mandelbrot3a_numba_better import mandelbrot_set_numba_better
+  shallow = (-0.74877, -0.74872, 0.06505, 0.06510, 500, 500, 2048)    # float64 still works here, so compare
+  render_perturbation(*shallow[:4], 8, 8, 64)                       # JIT warm-up
+  time1 = time.perf_counter()
+  escapeCounts, rebases = render_perturbation(*shallow)[2:]
+  time2 = time.perf_counter()
+  plain = mandelbrot_set_numba_better(*shallow)[2]
+  print('main.py zoom:\t\t' + str(time2 - time1) + 's, ' + str(rebases) + ' rebases, '
+        + str(np.mean(escapeCounts != plain) * 100) + '% of pixels differ from plain float64')
+
+  deep = view('-0.743643887037158704752191506114774', '0.131825904205311970493132056385139', '1e-25')
+  time1 = time.perf_counter()
+  escapeCounts, rebases = render_perturbation(*deep, 300, 300, 20000)[2:]
+  print('1e-25 zoom:\t\t' + str(time.perf_counter() - time1) + 's, ' + str(rebases) + ' rebases, '
+        + str(len(np.unique(escapeCounts))) + ' distinct escape counts (plain float64 would be one flat colour)')
@@ -0,0 +1,271 @@
+'''
+  Persistent, content-addressed tile cache for the mandelbrot_set_* entry points.
+
+  A cached frame is always exactly what the engine would have returned for it. Frames whose pixels lie on a global
+  lattice - pixel size a power of two, every pixel at (i * step, j * step), which is what latticeView hands out -
+  are assembled from _TILE_SIZE lattice tiles: a view panned by any number of pixels, or overlapping another, asks
+  for the same tiles. Power-of-two steps make np.linspace land on the lattice bit for bit, so a tile's pixels are
+  the frame's pixels. Any other frame is cached whole, keyed on its own bounds.
+  Every tile is keyed on an exact hash of (engine, x/y bounds, tile size, precision, output mode); maxIterations
+  goes in the file name next to that hash.
+  Tiles live as .npy files in _CACHE_DIR and are memory-mapped back on a hit (or .npz with compress = True, which
+  is smaller on disk but has to be read in full). An in-memory LRU sits in front of the disk, evicting by bytes.
+
+  The 'numba_better' engine is computed by a resumable copy of its kernel that also keeps the final z of every
+  pixel that hadn't escaped yet. When the same tile is asked for again with a bigger maxIterations, only those
+  pixels are iterated further, from where they stopped; the result is bit-identical to a fresh run. Only the
+  deepest state of a tile is kept.
+  Every other engine is cached as is and recomputed when maxIterations changes.
+'''
+
+import collections, glob, hashlib, math, os, tempfile, numpy as np
+from numba import njit, prange
+import engines
+from engines import register, phase, checkMode, OUTPUT_COUNTS
+
+_CACHE_DIR    = os.path.join(tempfile.gettempdir(), 'mandelbrot_cache')
+_MEMORY_BYTES = 256 * 1024 * 1024  # In-memory LRU budget
+_TILE_SIZE    = 256
+_FRAME_DEPENDENT = {'perturbation'}  # Engines whose pixels depend on the whole frame (its reference orbit): never tiled
+
+_memory      = collections.OrderedDict()  # File name -> escape counts, least recently used first
+_memoryBytes = 0
+stats        = collections.Counter()      # memory hits, disk hits, resumed, computed
+
+def configure(directory = None, memoryBytes = None):
+  global _CACHE_DIR, _MEMORY_BYTES
+  if directory is not None:
+    _CACHE_DIR = directory
+  if memoryBytes is not None:
+    _MEMORY_BYTES = memoryBytes
+    _evict()
+
+def clearMemory():
+  global _memoryBytes
+  _memory.clear()
+  _memoryBytes = 0
+
+def _evict():
+  global _memoryBytes
+  while _memoryBytes > _MEMORY_BYTES and _memory:
+    _, escapeCounts = _memory.popitem(last = False)
+    _memoryBytes -= escapeCounts.nbytes
+
+def _remember(name, escapeCounts):
+  global _memoryBytes
+  if name in _memory:
+    _memoryBytes -= _memory.pop(name).nbytes
+  _memory[name] = escapeCounts
+  _memoryBytes += escapeCounts.nbytes
+  _evict()
+
+def _exact(value):
+  # float.hex is exact; strings (perturbation bounds) are kept as given
+  return value if isinstance(value, str) else float(value).hex()
+
+def tileKey(engineName, xMin, xMax, yMin, yMax, width, height, precision, output):
+  text = '|'.join([engineName, _exact(xMin), _exact(xMax), _exact(yMin), _exact(yMax), str(width), str(height),
+                   np.dtype(precision).name, output])
+  return hashlib.sha256(text.encode()).hexdigest()
+
+def _save(path, array, compress):
+  # Write then rename, so a crash never leaves half a tile behind
+  os.makedirs(_CACHE_DIR, exist_ok = True)
+  handle, temporary = tempfile.mkstemp(dir = _CACHE_DIR, suffix = '.tmp')
+  with os.fdopen(handle, 'wb') as file:
+    if compress:
+      np.savez_compressed(file, escapeCounts = array)
+    else:
+      np.save(file, array)
+  os.replace(temporary, path)
+
+def _load(path):
+  if path.endswith('.npz'):
+    with np.load(path) as data:
+      return data['escapeCounts']
+  return np.load(path, mmap_mode = 'r')
+
+def _find(key, maxIterations):
+  for suffix in ('.npy', '.npz'):
+    path = os.path.join(_CACHE_DIR, key + '_' + str(maxIterations) + suffix)
+    if os.path.exists(path):
+      return path
+  return None
+
+@njit(parallel = True, cache = True)
+def mandelbrot_cache_pixels(realNums, imagNums, pixels, zReal, zImag, start, maxIterations, escapeCounts, escaped):
+  # Same arithmetic as mandelbrot_numba_better, but it can start part way through with z already known
+  width = realNums.shape[0]
+  for k in prange(pixels.shape[0]):
+    cReal = realNums[pixels[k] % width]
+    cImag = imagNums[pixels[k] // width]
+    real = zReal[k]
+    imag = zImag[k]
+    escapeCounts[pixels[k]] = 0
+    escaped[k] = False
+    for n in range(start, maxIterations):
+      realNew = real * real
+      imagNew = imag * imag
+      if realNew + imagNew > 4.0:
+        escapeCounts[pixels[k]] = n
+        escaped[k] = True
+        break
+      imag = 2 * real * imag + cImag
+      real = realNew - imagNew + cReal
+    zReal[k] = real
+    zImag[k] = imag
+
+def _statePath(key, maxIterations):
+  return os.path.join(_CACHE_DIR, key + '_' + str(maxIterations) + '.state.npz')
+
+def _resumableTile(key, xMin, xMax, yMin, yMax, width, height, maxIterations, path, compress):
+  realNums = np.linspace(xMin, xMax, width)
+  imagNums = np.linspace(yMin, yMax, height)
+  escapeCounts = np.zeros(width * height, np.int32)
+
+  previous = sorted((int(found.rsplit('_', 1)[1].split('.')[0]) for found in glob.glob(os.path.join(_CACHE_DIR, key + '_*.state.npz'))),
+                    reverse = True)
+  # A state is only usable next to its escape counts (a crash or a cleanup can leave one without the other)
+  previous = [(m, _find(key, m)) for m in previous if m < maxIterations]
+  previous = [(m, countsPath) for m, countsPath in previous if countsPath is not None]
+  if previous:                                         # Pick up where the deepest smaller run stopped
+    start, countsPath = previous[0]
+    escapeCounts[:] = _load(countsPath).ravel()
+    with np.load(_statePath(key, start)) as state:
+      pixels, zReal, zImag = state['pixels'], state['zReal'], state['zImag']
+    stats['resumed'] += 1
+  else:
+    start = 0
+    pixels = np.arange(width * height, dtype = np.int64)
+    zReal = np.ascontiguousarray(np.broadcast_to(realNums, (height, width)).ravel())   # z starts at c, like the kernel
+    zImag = np.ascontiguousarray(np.broadcast_to(imagNums[:, None], (height, width)).ravel())
+    stats['computed'] += 1
+
+  escaped = np.empty(pixels.shape[0], bool)
+  mandelbrot_cache_pixels(realNums, imagNums, pixels, zReal, zImag, start, maxIterations, escapeCounts, escaped)
+  pending = ~escaped
+  _save(path, escapeCounts.reshape((height, width)), compress)  # Counts first: a state file always has its counts
+  statePath = _statePath(key, maxIterations)
+  np.savez_compressed(statePath + '.tmp.npz', pixels = pixels[pending], zReal = zReal[pending], zImag = zImag[pending])
+  os.replace(statePath + '.tmp.npz', statePath)
+  if start:                                            # Superseded: resuming from this deeper state is always better
+    os.remove(_statePath(key, start))
+
+def cachedTile(engineName, xMin, xMax, yMin, yMax, width, height, maxIterations, precision = None, output = OUTPUT_COUNTS, compress = False):
+  '''One tile's escape counts, from memory, from disk, resumed from a smaller maxIterations, or computed.'''
+  engine = engines.get(engineName)
+  precision = engine.dtype if precision is None else np.dtype(precision)
+  checkMode(precision, output)
+  if precision not in engine.precisions:
+    raise ValueError(engineName + ' computes in ' + ', '.join(p.name for p in engine.precisions) + ', not ' + precision.name)
+  if output not in engine.outputs:
+    raise ValueError(engineName + ' returns ' + ', '.join(engine.outputs) + ', not ' + repr(output))
+  key = tileKey(engineName, xMin, xMax, yMin, yMax, width, height, precision, output)
+  name = key + '_' + str(maxIterations)
+
+  if name in _memory:
+    _memory.move_to_end(name)
+    stats['memory hits'] += 1
+    return _memory[name]
+  path = _find(key, maxIterations)
+  if path is not None:
+    stats['disk hits'] += 1
+    escapeCounts = _load(path)
+    _remember(name, escapeCounts)
+    return escapeCounts
+
+  path = os.path.join(_CACHE_DIR, name + ('.npz' if compress else '.npy'))
+  if engineName == 'numba_better' and output == OUTPUT_COUNTS and precision == np.float64:   # The resumable kernel is float64
+    _resumableTile(key, xMin, xMax, yMin, yMax, width, height, maxIterations, path, compress)
+  else:
+    kwargs = {}
+    if len(engine.precisions) > 1 or len(engine.outputs) > 1:
+      kwargs = {'precision': precision, 'output': output}
+    escapeCounts = engine.func(xMin, xMax, yMin, yMax, width, height, maxIterations, **kwargs)[2]
+    stats['computed'] += 1
+    _save(path, np.ascontiguousarray(escapeCounts), compress)
+  escapeCounts = _load(path)
+  _remember(name, escapeCounts)
+  return escapeCounts
+
+def latticeView(centerReal, centerImag, width, height, zoom):
+  '''(xMin, xMax, yMin, yMax) of the lattice-aligned view with pixel size 2**-zoom nearest to the given centre.'''
+  step = 2.0 ** -zoom
+  i0 = round(centerReal / step - (width - 1) / 2)
+  j0 = round(centerImag / step - (height - 1) / 2)
+  return (i0 * step, (i0 + width - 1) * step, j0 * step, (j0 + height - 1) * step)
+
+def _onLattice(nums):
+  '''(index of the first pixel, step) if every coordinate is exactly index * step for a power-of-two step, else None.'''
+  if len(nums) < 2:
+    return None
+  step = (nums[-1] - nums[0]) / (len(nums) - 1)
+  if step <= 0 or math.frexp(step)[0] != 0.5 or nums[0] / step != math.floor(nums[0] / step):
+    return None
+  index = int(nums[0] / step)
+  if not np.array_equal(nums, (index + np.arange(len(nums))) * step):
+    return None
+  return (index, step)
+
+def render_cached(engineName, xMin, xMax, yMin, yMax, width, height, maxIterations, tileSize = _TILE_SIZE, **kwargs):
+  '''The engine's (realNums, imagNums, escapeCounts) for the frame, from lattice tiles or a whole-frame entry.'''
+  realNums = np.linspace(xMin, xMax, width)
+  imagNums = np.linspace(yMin, yMax, height)
+  columns, rows = _onLattice(realNums), _onLattice(imagNums)
+  phase('kernel')
+  if columns is None or rows is None or engineName in _FRAME_DEPENDENT:
+    escapeCounts = np.array(cachedTile(engineName, xMin, xMax, yMin, yMax, width, height, maxIterations, **kwargs))
+    phase('post')
+    return (realNums, imagNums, escapeCounts)
+
+  (i0, xStep), (j0, yStep) = columns, rows
+  tx0, tx1 = i0 // tileSize, (i0 + width - 1) // tileSize
+  ty0, ty1 = j0 // tileSize, (j0 + height - 1) // tileSize
+  block = None                                         # The tiles the frame touches, side by side
+  for ty in range(ty0, ty1 + 1):
+    for tx in range(tx0, tx1 + 1):
+      tile = cachedTile(engineName, tx * tileSize * xStep, (tx * tileSize + tileSize - 1) * xStep,
+                        ty * tileSize * yStep, (ty * tileSize + tileSize - 1) * yStep, tileSize, tileSize, maxIterations, **kwargs)
+      if block is None:
+        block = np.empty(((ty1 - ty0 + 1) * tileSize, (tx1 - tx0 + 1) * tileSize), tile.dtype)
+      block[(ty - ty0) * tileSize:(ty - ty0 + 1) * tileSize, (tx - tx0) * tileSize:(tx - tx0 + 1) * tileSize] = tile
+  phase('post')
+  row0, col0 = j0 - ty0 * tileSize, i0 - tx0 * tileSize
+  return (realNums, imagNums, block[row0:row0 + height, col0:col0 + width].copy())
+
+def cached(engineName, **kwargs):
+  '''A cached drop-in for an engine, with the usual (xMin, xMax, yMin, yMax, width, height, maxIterations) signature.'''
+  def mandelbrot_set_cached(xMin, xMax, yMin, yMax, width, height, maxIterations):
+    return render_cached(engineName, xMin, xMax, yMin, yMax, width, height, maxIterations, **kwargs)
+  return mandelbrot_set_cached
+
+mandelbrot_set_cached = register('cached', np.float64, parallel = True)(cached('numba_better'))
+
+# Timings and exactness checks: python mandelbrot_cache.py
+if __name__ == '__main__':
+  import time
+  from mandelbrot3a_numba_better import mandelbrot_set_numba_better
+  configure(directory = tempfile.mkdtemp(prefix = 'mandelbrot_cache_'))
+  view = (-0.74877, -0.74872, 0.06505, 0.06510, 1000, 1000)          # Off the lattice: cached as a whole frame
+  render_cached('numba_better', *view[:4], 16, 16, 64)                 # JIT warm-up
+
+  for label, maxIterations in (('cold', 1024), ('memory hit', 1024), ('resumed to 2048', 2048)):
+    time1 = time.perf_counter()
+    escapeCounts = render_cached('numba_better', *view, maxIterations)[2]
+    print(label + ':\t' + str(time.perf_counter() - time1) + 's')
+  clearMemory()
+  time1 = time.perf_counter()
+  escapeCounts = render_cached('numba_better', *view, 2048)[2]
+  print('disk hit:\t' + str(time.perf_counter() - time1) + 's')
+  assert np.array_equal(escapeCounts, mandelbrot_set_numba_better(*view, 2048)[2]), 'resumed frame differs from numba_better'
+
+  # A viewer on the lattice, panning by a fraction of a tile: most tiles are already there
+  step = 2.0 ** -24
+  lattice = latticeView(-0.748745, 0.065075, 1000, 1000, 24)
+  for label, shift in (('lattice cold', 0), ('panned 77 px', 77 * step)):
+    panned = (lattice[0] + shift, lattice[1] + shift) + lattice[2:] + (1000, 1000, 2048)
+    time1 = time.perf_counter()
+    escapeCounts = render_cached('numba_better', *panned)[2]
+    print(label + ':\t' + str(time.perf_counter() - time1) + 's')
+  assert np.array_equal(escapeCounts, mandelbrot_set_numba_better(*panned)[2]), 'lattice tiles differ from numba_better'
+  print(dict(stats))
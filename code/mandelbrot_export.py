@@ -0,0 +1,155 @@
+'''
+  Headless image export, no matplotlib.
+
+  Escape counts are turned into RGB with one vectorized lookup: a (maxIterations + 1, 3) uint8 table holding the
+  colour of every possible count, built once from the colormap ('hot' or 'gnuplot', same formulas and 256-entry
+  quantization as matplotlib) under the same PowerNorm(0.4) curve mandelbrot_visualizer uses. The norm runs over
+  0..maxIterations rather than the frame's own min/max, so tiles rendered separately still match.
+
+  The frame is rendered one band of tiles at a time (see mandelbrot_tiled) and each band is colorized and streamed
+  straight out: into a PNG (one zlib stream, an IDAT chunk per band) or into a binary PPM mapped with np.memmap.
+  Peak memory is one band - tileSize rows of the full width - however big the frame is.
+  Compute, colorize and encode times are reported separately.
+
+    python mandelbrot_export.py mandelbrot.png --width 8000 --height 8000 --iterations 256 --cmap hot
+'''
+
+import argparse, collections, struct, time, zlib, numpy as np
+from mandelbrot_tiled import mandelbrot_tile
+
+_TILE_SIZE = 1024     # Rows per band (and columns per tile)
+_GAMMA     = 0.4      # PowerNorm gamma, as in mandelbrot_visualizer
+_LUT_SIZE  = 256      # matplotlib colormaps are 256-entry tables too
+_PNG_LEVEL = 6        # zlib level for files; the tile server uses 1
+
+# matplotlib's segment data for 'hot', and gnuplot's palette functions 7, 5, 15 for 'gnuplot'
+_HOT = {0: ([0.0, 0.365079, 1.0], [0.0416, 1.0, 1.0]),
+        1: ([0.0, 0.365079, 0.746032, 1.0], [0.0, 0.0, 1.0, 1.0]),
+        2: ([0.0, 0.746032, 1.0], [0.0, 0.0, 1.0])}
+_COLORMAPS = {
+  'hot':     lambda x: np.stack([np.interp(x, *_HOT[channel]) for channel in range(3)], axis = -1),
+  'gnuplot': lambda x: np.stack([np.sqrt(x), x ** 3, np.sin(2 * np.pi * x)], axis = -1),
+}
+
+PngStream = collections.namedtuple('PngStream', ['file', 'compressor', 'width', 'height'])
+
+def colormapLut(maxIterations, cmap = 'hot', gamma = _GAMMA):
+  '''(maxIterations + 1, 3) uint8: the RGB of every escape count 0..maxIterations.'''
+  if cmap not in _COLORMAPS:
+    raise KeyError('No colormap ' + repr(cmap) + ', choose from ' + ', '.join(_COLORMAPS))
+  table = np.clip(_COLORMAPS[cmap](np.linspace(0.0, 1.0, _LUT_SIZE)), 0.0, 1.0)
+  t = (np.arange(maxIterations + 1) / max(maxIterations, 1)) ** gamma
+  index = np.minimum((t * _LUT_SIZE).astype(np.intp), _LUT_SIZE - 1)   # Same binning as matplotlib's Colormap.__call__
+  return (table[index] * 255 + 0.5).astype(np.uint8)
+
+def colorize(escapeCounts, lut, out = None):
+  '''(..., 3) uint8 image; smooth (float) escape times are floored onto the table.'''
+  if escapeCounts.dtype.kind == 'f':
+    escapeCounts = np.clip(escapeCounts, 0, len(lut) - 1).astype(np.intp)
+  return np.take(lut, escapeCounts, axis = 0, out = out, mode = 'clip')
+
+def _chunk(kind, data):
+  return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+def _header(width, height):
+  return b'\x89PNG\r\n\x1a\n' + _chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))  # 8-bit RGB
+
+def _scanlines(rgb):
+  rows = np.zeros((rgb.shape[0], 1 + rgb.shape[1] * 3), np.uint8)  # Filter byte 0 (none) in front of every row
+  rows[:, 1:] = rgb.reshape(rgb.shape[0], -1)
+  return rows.tobytes()
+
+def encodePng(rgb, level = _PNG_LEVEL):
+  '''A whole (height, width, 3) image as PNG bytes, in memory.'''
+  return _header(rgb.shape[1], rgb.shape[0]) + _chunk(b'IDAT', zlib.compress(_scanlines(rgb), level)) + _chunk(b'IEND', b'')
+
+def openPng(path, width, height, level = _PNG_LEVEL):
+  file = open(path, 'wb')
+  file.write(_header(width, height))
+  return PngStream(file, zlib.compressobj(level), width, height)
+
+def writePngRows(png, rgb):
+  data = png.compressor.compress(_scanlines(rgb))
+  if data:
+    png.file.write(_chunk(b'IDAT', data))
+
+def closePng(png):
+  png.file.write(_chunk(b'IDAT', png.compressor.flush()) + _chunk(b'IEND', b''))
+  png.file.close()
+
+def openPpm(path, width, height):
+  '''Binary PPM (P6) preallocated on disk and mapped as a (height, width, 3) uint8 array, writable in any order.'''
+  header = ('P6\n' + str(width) + ' ' + str(height) + '\n255\n').encode()
+  with open(path, 'wb') as file:
+    file.write(header)
+  return np.memmap(path, dtype = np.uint8, mode = 'r+', offset = len(header), shape = (height, width, 3))
+
+def export(path, xMin, xMax, yMin, yMax, width, height, maxIterations, cmap = 'hot', gamma = _GAMMA, func = None,
+           tileSize = _TILE_SIZE, level = _PNG_LEVEL):
+  '''Renders and writes a .png or .ppm band by band; returns {'compute', 'colorize', 'encode'} seconds.'''
+  lut = colormapLut(maxIterations, cmap, gamma)
+  realNums = np.linspace(xMin, xMax, width)
+  imagNums = np.linspace(yMin, yMax, height)[::-1]       # Image row 0 is the top, yMax (origin = 'lower' in the visualizer)
+  xStep = (xMax - xMin) / (width  - 1) if width  > 1 else 0.0
+  yStep = (yMax - yMin) / (height - 1) if height > 1 else 0.0
+  counts = np.empty((min(tileSize, height), width), np.int32)     # One band, reused
+  rgb = np.empty(counts.shape + (3,), np.uint8)
+  timings = {'compute': 0.0, 'colorize': 0.0, 'encode': 0.0}
+
+  if path.lower().endswith('.ppm'):
+    ppm, png = openPpm(path, width, height), None
+  else:
+    ppm, png = None, openPng(path, width, height, level)
+  for row0 in range(0, height, tileSize):
+    rows = min(tileSize, height - row0)
+    start = time.perf_counter()
+    for col0 in range(0, width, tileSize):
+      col1 = min(col0 + tileSize, width)
+      if func is None:
+        mandelbrot_tile(xMin, xStep, yMax, -yStep, row0, col0, maxIterations, counts[:rows, col0:col1])
+      else:
+        counts[:rows, col0:col1] = func(realNums[col0], realNums[col1 - 1], imagNums[row0 + rows - 1], imagNums[row0],
+                                        col1 - col0, rows, maxIterations)[2][::-1]
+    timings['compute'] += time.perf_counter() - start
+
+    start = time.perf_counter()
+    colorize(counts[:rows], lut, out = rgb[:rows])
+    timings['colorize'] += time.perf_counter() - start
+    start = time.perf_counter()
+    if png is not None:
+      writePngRows(png, rgb[:rows])
+    else:
+      ppm[row0:row0 + rows] = rgb[:rows]
+      ppm.flush()
+    timings['encode'] += time.perf_counter() - start
+
+  start = time.perf_counter()
+  if png is not None:
+    closePng(png)
+  else:
+    del ppm
+  timings['encode'] += time.perf_counter() - start
+  return timings
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description = 'Render the Mandelbrot set straight to a PNG or PPM file')
+  parser.add_argument('path',         help = '.png or .ppm')
+  parser.add_argument('--width',      type = int,   default = 4000)
+  parser.add_argument('--height',     type = int,   default = 4000)
+  parser.add_argument('--iterations', type = int,   default = 80)
+  parser.add_argument('--view',       type = float, nargs = 4, default = [-2.0, 0.5, -1.2, 1.2], metavar = ('XMIN', 'XMAX', 'YMIN', 'YMAX'))
+  parser.add_argument('--cmap',       choices = sorted(_COLORMAPS), default = 'hot')
+  parser.add_argument('--gamma',      type = float, default = _GAMMA)
+  parser.add_argument('--engine',     help = 'any registered engine (default: the tiled Numba kernel)')
+  parser.add_argument('--tile-size',  type = int,   default = _TILE_SIZE)
+  parser.add_argument('--level',      type = int,   default = _PNG_LEVEL, help = 'PNG zlib level 0-9')
+  args = parser.parse_args()
+
+  func = None
+  if args.engine:
+    import engines
+    func = engines.get(args.engine).func
+  mandelbrot_tile(0.0, 0.0, 0.0, 0.0, 0, 0, 1, np.empty((1, 1), np.int32)[:, 0:1])  # JIT warm-up, not timed
+  timings = export(args.path, *args.view, args.width, args.height, args.iterations, args.cmap, args.gamma, func, args.tile_size, args.level)
+  print(args.path + ': ' + str(args.width) + ' x ' + str(args.height) + ', compute ' + '%.3f' % timings['compute'] + 's, colorize '
+        + '%.3f' % timings['colorize'] + 's, encode ' + '%.3f' % timings['encode'] + 's')
@@ -0,0 +1,127 @@
+'''
+  Progressive rendering: a coarse preview straight away, refined in place to full resolution.
+
+  render_progressive is a generator of frames. The first pass computes every _STRIDE-th pixel in both directions
+  (1/8 scale by default) and each later pass halves the stride, computing only the new sample positions: the pixels
+  an earlier pass already did are never iterated again, so all the passes together cost one full render plus a few
+  percent. Every sample also fills its stride x stride block, so each frame is a complete full-size nearest-neighbour
+  preview and the last one (stride 1) is exactly mandelbrot_set_numba_better's result.
+
+  skipUniform = True fills a new sample without iterating when the four coarse samples around it agree, the same
+  bet Mariani-Silver makes (mandelbrot8_mariani_silver): it is almost always right, but a filament thinner than the
+  coarse spacing can slip through, so the final frame is then an approximation.
+
+  Changing the view:
+    frames.send((xMin, xMax, yMin, yMax))  between passes: abandons the remaining passes and returns the first frame
+                                           of the new view (the buffer is reused)
+    cancel.set()                           cancel is a threading.Event, set from any other thread (the kernel is nogil):
+                                           the running pass stops after its band of rows and the generator ends
+  A flag read inside the prange loop itself gets hoisted out of it by LLVM, so passes run in bands of _BAND_ROWS
+  sample rows per thread and the flag is checked between bands.
+  mandelbrot_visualizer.visualize_progressive shows it in a window that re-renders when you pan or zoom.
+
+    python mandelbrot_progressive.py
+'''
+
+import collections, time, numba, numpy as np
+from numba import njit, prange
+from mandelbrot3a_numba_better import mandelbrot_numba_better
+
+_STRIDE    = 8   # First pass samples every 8th pixel (1/8 scale); must be a power of two
+_BAND_ROWS = 16  # Sample rows per thread between cancel checks
+
+Frame = collections.namedtuple('Frame', ['stride', 'realNums', 'imagNums', 'escapeCounts', 'computed', 'seconds'])
+
+@njit(parallel = True, nogil = True, cache = True)
+def mandelbrot_progressive_pass(realNums, imagNums, maxIterations, stride, first, skipUniform, row0, row1, escapeCounts):
+  height, width = escapeCounts.shape
+  coarse = 2 * stride                                  # The previous pass's spacing
+  computed = 0
+  for r in prange(row0, row1):                         # Sample rows row0..row1-1, i.e. pixel rows r * stride
+    j = r * stride
+    for i in range(0, width, stride):
+      if not first and j % coarse == 0 and i % coarse == 0:
+        continue                                       # Done by an earlier pass
+      value = -1
+      if skipUniform and not first:
+        j0 = j - j % coarse                            # Coarse cell around this sample (clamped at the bottom/right edge)
+        i0 = i - i % coarse
+        j1 = j0 + coarse if j0 + coarse < height else j0
+        i1 = i0 + coarse if i0 + coarse < width else i0
+        corner = escapeCounts[j0, i0]
+        if escapeCounts[j0, i1] == corner and escapeCounts[j1, i0] == corner and escapeCounts[j1, i1] == corner:
+          value = corner
+      if value < 0:
+        value = mandelbrot_numba_better(realNums[i], imagNums[j], maxIterations)
+        computed += 1
+      for jj in range(j, min(j + stride, height)):     # Preview block; finer passes overwrite all of it but (j, i)
+        for ii in range(i, min(i + stride, width)):
+          escapeCounts[jj, ii] = value
+  return computed
+
+def render_progressive(xMin, xMax, yMin, yMax, width, height, maxIterations, stride = _STRIDE, skipUniform = False, cancel = None):
+  '''Yields a Frame per pass, coarsest first. escapeCounts is the same live buffer every time: copy it to keep one.'''
+  if stride < 1 or stride & (stride - 1):
+    raise ValueError('stride must be a power of two, got ' + str(stride))
+  escapeCounts = np.empty((height, width), np.int32)
+  band = _BAND_ROWS * numba.get_num_threads()
+  view = (xMin, xMax, yMin, yMax)
+  while view is not None:
+    realNums = np.linspace(view[0], view[1], width)
+    imagNums = np.linspace(view[2], view[3], height)
+    view = None
+    step = stride
+    while step >= 1 and view is None:
+      start = time.perf_counter()
+      computed = 0
+      rows = (height + step - 1) // step
+      for row0 in range(0, rows, band):
+        if cancel is not None and cancel.is_set():
+          return
+        computed += mandelbrot_progressive_pass(realNums, imagNums, maxIterations, step, step == stride, skipUniform,
+                                                row0, min(row0 + band, rows), escapeCounts)
+      view = yield Frame(step, realNums, imagNums, escapeCounts, computed, time.perf_counter() - start)
+      step //= 2
+
+# Checks the last frame against the plain kernel and times each pass: python mandelbrot_progressive.py
+if __name__ == '__main__':
+  import threading
+  from mandelbrot3a_numba_better import mandelbrot_set_numba_better
+  views = {'full set': (-2.0, 0.5, -1.2, 1.2, 1000, 1000, 80),
+           'deep zoom': (-0.74877, -0.74872, 0.06505, 0.06510, 1000, 1000, 2048)}
+  for frame in render_progressive(-2.0, 0.5, -1.2, 1.2, 16, 16, 2, skipUniform = True):  # JIT warm-up
+    pass
+
+  for name, view in views.items():
+    time1 = time.perf_counter()
+    full = mandelbrot_set_numba_better(*view)[2]
+    time2 = time.perf_counter()
+    print(name + '\t\tfull render ' + '%.4f' % (time2 - time1) + 's')
+    for skipUniform in (False, True):
+      total = 0.0
+      for frame in render_progressive(*view, skipUniform = skipUniform):
+        total += frame.seconds
+        print('  ' + ('skip uniform' if skipUniform else 'exact') + '\t1/' + str(frame.stride) + '\t' + '%8d' % frame.computed
+              + ' pixels\t' + '%.4f' % frame.seconds + 's\t(' + '%.4f' % total + 's so far)')
+      wrong = np.count_nonzero(frame.escapeCounts != full)
+      assert skipUniform or wrong == 0, name + ': final frame differs from mandelbrot_set_numba_better'
+      if skipUniform:
+        print('  skip uniform\t' + str(wrong) + ' of ' + str(full.size) + ' pixels differ')
+
+  # A new viewport mid-way: the remaining passes are dropped and the new view still ends exact
+  view = views['deep zoom']
+  frames = render_progressive(*views['full set'])
+  next(frames)
+  frame = frames.send(view[:4])
+  assert frame.stride == _STRIDE
+  for frame in frames:
+    pass
+  assert np.array_equal(frame.escapeCounts, mandelbrot_set_numba_better(*view[:4], *views['full set'][4:])[2])
+
+  # Cancelling from another thread cuts the running pass short
+  cancel = threading.Event()
+  timer = threading.Timer(0.05, cancel.set)
+  start = time.perf_counter()
+  timer.start()
+  frames = list(render_progressive(*view[:4], 4000, 4000, view[6], cancel = cancel))
+  print('cancelled after ' + str(len(frames)) + ' frames, ' + '%.3f' % (time.perf_counter() - start) + 's')
@@ -0,0 +1,165 @@
+'''
+  Asyncio XYZ tile server for slippy-map viewers (Leaflet, OpenLayers): GET /{z}/{x}/{y}.png
+
+  Standard library only (asyncio streams, a minimal HTTP/1.1 with keep-alive); PNGs come from mandelbrot_export.
+  Tiles are _TILE_SIZE pixels square. Zoom 0 is one tile covering _WORLD; every zoom level halves the tile size, and
+  y counts down from the top like every XYZ scheme. maxIterations grows with zoom, or set it with ?iterations=N
+  (1 to _MAX_ITERATIONS, 400 Bad Request otherwise).
+
+  Tiles are computed in a bounded pool (--workers) off the event loop:
+    --pool thread   (default) a ThreadPoolExecutor running the nogil row kernel from mandelbrot3a_numba_better,
+                    so the threads really run in parallel; zlib releases the GIL while compressing too
+    --pool process  a ProcessPoolExecutor (forkserver), for kernels that hold the GIL
+  Concurrent requests for the same tile share one computation. A tile whose every requester has disconnected is
+  cancelled: dropped from the queue if it hasn't started, its result thrown away if it has (threads can't be killed).
+  GET /stats returns the counters (computed, coalesced, cancelled, ...) as JSON.
+
+    python mandelbrot_tile_server.py --port 8000 --workers 4
+  Load test: python benchmark_tiles.py
+'''
+
+import argparse, asyncio, collections, concurrent.futures, functools, json, multiprocessing, os, re, numpy as np
+from mandelbrot3a_numba_better import mandelbrot_numba_better_rows
+from mandelbrot_export import colormapLut, colorize, encodePng
+
+_TILE_SIZE           = 256
+_WORLD               = (-2.25, 0.75, -1.5, 1.5)  # (xMin, xMax, yMin, yMax) of tile 0/0/0
+_BASE_ITERATIONS     = 128
+_ZOOM_ITERATIONS     = 64                        # Extra iterations per zoom level
+_MAX_ZOOM            = 40                        # Past ~45 float64 can't tell neighbouring pixels apart
+_MAX_ITERATIONS      = 4 * (_BASE_ITERATIONS + _ZOOM_ITERATIONS * _MAX_ZOOM)  # Cap on ?iterations=: one tile can't hog a worker
+_PNG_LEVEL           = 1                         # zlib level: fast; tiles are mostly flat colour and compress well anyway
+_CMAP                = 'hot'
+_TILE_PATH           = re.compile(r'^/(\d+)/(\d+)/(\d+)\.png(?:\?iterations=(\d+))?$')
+
+_executor = None
+_inflight = {}                                   # (z, x, y, maxIterations) -> [future, number of requests waiting on it]
+stats     = collections.Counter()
+
+def tileBounds(z, x, y):
+  '''Complex-plane (xMin, xMax, yMin, yMax) of an XYZ tile.'''
+  size = (_WORLD[1] - _WORLD[0]) / 2 ** z
+  xMin = _WORLD[0] + x * size
+  yMax = _WORLD[3] - y * size
+  return (xMin, xMin + size, yMax - size, yMax)
+
+def tileIterations(z):
+  return _BASE_ITERATIONS + _ZOOM_ITERATIONS * z
+
+@functools.lru_cache(maxsize = 64)
+def _lut(maxIterations):
+  return colormapLut(maxIterations, _CMAP)
+
+def renderTile(z, x, y, maxIterations):
+  '''Runs in the pool: escape counts for the tile's pixel centres, colorized and PNG encoded.'''
+  xMin, xMax, yMin, yMax = tileBounds(z, x, y)
+  step = (xMax - xMin) / _TILE_SIZE
+  escapeCounts = np.empty((_TILE_SIZE, _TILE_SIZE), np.int32)
+  # Row 0 is the top of the image, so walk y downwards from the first pixel centre
+  mandelbrot_numba_better_rows(xMin + step / 2, step, yMax - step / 2, -step, 0, maxIterations, escapeCounts)
+  return encodePng(colorize(escapeCounts, _lut(maxIterations)), _PNG_LEVEL)
+
+def _warmUp():
+  renderTile(0, 0, 0, 1)                         # JIT compile (or load from the on-disk cache) before the first request
+
+def startPool(workers, pool = 'thread'):
+  global _executor
+  if pool == 'process':
+    methods = multiprocessing.get_all_start_methods()  # Never plain fork after Numba has started threads (see mandelbrot6_multiprocessing)
+    context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+    _executor = concurrent.futures.ProcessPoolExecutor(workers, mp_context = context, initializer = _warmUp)
+  else:
+    _warmUp()
+    _executor = concurrent.futures.ThreadPoolExecutor(workers)
+  return _executor
+
+async def getTile(key):
+  '''PNG bytes for a tile; joins the computation already in flight for the same key if there is one.'''
+  entry = _inflight.get(key)
+  if entry is None:
+    entry = _inflight[key] = [asyncio.get_running_loop().run_in_executor(_executor, renderTile, *key), 0]
+    entry[0].add_done_callback(lambda future: _inflight.pop(key) if _inflight.get(key) is entry else None)
+    stats['computed'] += 1
+  else:
+    stats['coalesced'] += 1
+  entry[1] += 1
+  try:
+    return await asyncio.shield(entry[0])        # Shielded: one requester going away mustn't cancel it for the rest
+  finally:
+    entry[1] -= 1
+    if entry[1] == 0 and not entry[0].done():    # Nobody is waiting any more
+      entry[0].cancel()
+      _inflight.pop(key, None)
+      stats['cancelled'] += 1
+
+def _response(writer, status, body, contentType, keepAlive):
+  writer.write(('HTTP/1.1 ' + status + '\r\nContent-Type: ' + contentType + '\r\nContent-Length: ' + str(len(body))
+                + '\r\nAccess-Control-Allow-Origin: *\r\nConnection: ' + ('keep-alive' if keepAlive else 'close') + '\r\n\r\n').encode() + body)
+
+async def handle(reader, writer):
+  buffer = b''
+  try:
+    while True:
+      while b'\r\n\r\n' not in buffer:
+        data = await reader.read(65536)
+        if not data:
+          return
+        buffer += data
+      head, buffer = buffer.split(b'\r\n\r\n', 1)
+      requestLine = head.split(b'\r\n', 1)[0].decode('latin-1').split()
+      keepAlive = len(requestLine) == 3 and requestLine[2] == 'HTTP/1.1' and b'connection: close' not in head.lower()
+      match = _TILE_PATH.match(requestLine[1]) if len(requestLine) == 3 and requestLine[0] == 'GET' else None
+
+      if match is None:
+        if len(requestLine) == 3 and requestLine[1] == '/stats':
+          _response(writer, '200 OK', json.dumps(dict(stats, inflight = len(_inflight))).encode(), 'application/json', keepAlive)
+        else:
+          _response(writer, '404 Not Found', b'GET /{z}/{x}/{y}.png\n', 'text/plain', keepAlive)
+      else:
+        z, x, y = int(match.group(1)), int(match.group(2)), int(match.group(3))
+        maxIterations = int(match.group(4)) if match.group(4) else tileIterations(z)
+        if z > _MAX_ZOOM or x >= 2 ** z or y >= 2 ** z:
+          _response(writer, '404 Not Found', b'No such tile\n', 'text/plain', keepAlive)
+        elif not 1 <= maxIterations <= _MAX_ITERATIONS:
+          _response(writer, '400 Bad Request', ('iterations must be 1 to ' + str(_MAX_ITERATIONS) + '\n').encode(), 'text/plain', keepAlive)
+        else:
+          tile = asyncio.ensure_future(getTile((z, x, y, maxIterations)))
+          watch = asyncio.ensure_future(reader.read(65536))          # Notices the client hanging up while we compute
+          await asyncio.wait({tile, watch}, return_when = asyncio.FIRST_COMPLETED)
+          if watch.done() and not watch.result() and not tile.done():
+            tile.cancel()                                             # Disconnected: stop waiting (getTile cleans up)
+            stats['disconnected'] += 1
+            return
+          png = await tile
+          if not watch.done():
+            watch.cancel()
+            await asyncio.wait({watch})                               # Let the read actually stop before the next one
+          if not watch.cancelled():
+            buffer += watch.result()                                  # A pipelined next request, keep it
+          _response(writer, '200 OK', png, 'image/png', keepAlive)
+      await writer.drain()
+      if not keepAlive:
+        return
+  except (ConnectionError, asyncio.CancelledError):
+    pass
+  finally:
+    writer.close()
+
+async def serve(host = '127.0.0.1', port = 8000, workers = None, pool = 'thread'):
+  startPool(workers or os.cpu_count(), pool)
+  server = await asyncio.start_server(handle, host, port)
+  print('Serving http://' + host + ':' + str(port) + '/{z}/{x}/{y}.png with', _executor._max_workers, pool, 'workers', flush = True)
+  async with server:
+    await server.serve_forever()
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description = 'Mandelbrot XYZ tile server')
+  parser.add_argument('--host',    default = '127.0.0.1')
+  parser.add_argument('--port',    type = int, default = 8000)
+  parser.add_argument('--workers', type = int, default = os.cpu_count())
+  parser.add_argument('--pool',    choices = ['thread', 'process'], default = 'thread')
+  args = parser.parse_args()
+  try:
+    asyncio.run(serve(args.host, args.port, args.workers, args.pool))
+  except KeyboardInterrupt:
+    pass
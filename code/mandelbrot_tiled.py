@@ -0,0 +1,55 @@
+'''
+  Tiled, memory-bounded rendering for very large frames (32,000 x 32,000 and up).
+
+  The frame is split into tileSize x tileSize tiles that are streamed into a preallocated np.memmap on disk,
+  so peak memory depends on the tile size and not on the frame size.
+
+  With no backend given, the tile kernel works out each pixel's coordinates from its index on the fly (no grid at all).
+  Any backend with the usual (xMin, xMax, yMin, yMax, width, height, maxIterations) signature can be passed instead,
+  it is then called once per tile with that tile's bounds.
+'''
+
+import tempfile, numpy as np
+from numba import njit, prange
+from engines import register, phase
+from mandelbrot3a_numba_better import mandelbrot_numba_better
+
+_TILE_SIZE = 1024  # 1024 x 1024 int32 = 4 MB per tile
+
+@njit(parallel = True, nogil = True, cache = True)
+def mandelbrot_tile(xMin, xStep, yMin, yStep, row0, col0, maxIterations, output):
+  for j in prange(output.shape[0]):
+    cImag = yMin + (row0 + j) * yStep          # Coordinates come from the pixel index, no linspace grid needed
+    for i in range(output.shape[1]):
+      output[j, i] = mandelbrot_numba_better(xMin + (col0 + i) * xStep, cImag, maxIterations)
+
+def openOutput(width, height, path = None):
+  '''Preallocates the (height, width) int32 output on disk; an anonymous temporary file if no path is given.'''
+  if path is None:
+    path = tempfile.TemporaryFile()
+  return np.memmap(path, dtype = np.int32, mode = 'w+', shape = (height, width))
+
+def render_tiled(xMin, xMax, yMin, yMax, width, height, maxIterations, func = None, tileSize = _TILE_SIZE, path = None):
+  realNums = np.linspace(xMin, xMax, width)    # Only 1D, so these stay small even at 32k
+  imagNums = np.linspace(yMin, yMax, height)
+  xStep = (xMax - xMin) / (width  - 1) if width  > 1 else 0.0
+  yStep = (yMax - yMin) / (height - 1) if height > 1 else 0.0
+  escapeCounts = openOutput(width, height, path)
+
+  phase('kernel')
+  for row0 in range(0, height, tileSize):
+    row1 = min(row0 + tileSize, height)
+    for col0 in range(0, width, tileSize):
+      col1 = min(col0 + tileSize, width)
+      tile = np.asarray(escapeCounts[row0:row1, col0:col1])  # Plain ndarray view straight into the mapped file
+      if func is None:
+        mandelbrot_tile(xMin, xStep, yMin, yStep, row0, col0, maxIterations, tile)
+      else:
+        tile[:] = func(realNums[col0], realNums[col1 - 1], imagNums[row0], imagNums[row1 - 1], col1 - col0, row1 - row0, maxIterations)[2]
+    escapeCounts.flush()                                     # Write back each band of tiles so dirty pages don't pile up
+  phase('post')
+  return (realNums, imagNums, escapeCounts)
+
+@register('tiled', np.float64, parallel = True)
+def mandelbrot_set_tiled(xMin, xMax, yMin, yMax, width, height, maxIterations):
+  return render_tiled(xMin, xMax, yMin, yMax, width, height, maxIterations)
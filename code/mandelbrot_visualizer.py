@@ -13,6 +13,7 @@ def visualize(xMin, xMax, yMin, yMax, maxIterations, func, name):
   imgWidth  = _DPI * _IMG_WIDTH
   imgHeight = _DPI * _IMG_HEIGHT
   x, y, z = func(xMin, xMax, yMin, yMax, imgWidth, imgHeight, maxIterations)
+  time2 = time.time()                           # Kernel and plotting timed apart (mandelbrot_export.py writes files without matplotlib)
   
   fig, ax = plt.subplots(figsize = (_IMG_WIDTH, _IMG_HEIGHT), dpi = _DPI)
   ticks = np.arange(0, imgWidth, 3 * _DPI)
@@ -22,7 +23,45 @@ def visualize(xMin, xMax, yMin, yMax, maxIterations, func, name):
   plt.yticks(ticks, y_ticks)
   
   norm = colors.PowerNorm(0.4)
-  ax.imshow(z.T, cmap = _CMAP, origin = 'lower', norm = norm)
+  ax.imshow(z, cmap = _CMAP, origin = 'lower', norm = norm)  # z is already (height, width)
   plt.title(name)
-  print(name + '\t\t' + str(time.time() - time1) + 's')
-  plt.show()
\ No newline at end of file
+  print(name + '\t\t' + str(time2 - time1) + 's compute, ' + str(time.time() - time2) + 's plot')
+  plt.show()
+
+def visualize_progressive(xMin, xMax, yMin, yMax, maxIterations, name, skipUniform = False):
+  '''A coarse preview at once, refined in place (mandelbrot_progressive); pan or zoom with the toolbar to re-render.'''
+  from mandelbrot_progressive import render_progressive
+  imgWidth  = _DPI * _IMG_WIDTH
+  imgHeight = _DPI * _IMG_HEIGHT
+  view = (xMin, xMax, yMin, yMax)
+  moved = []                                    # New views from the toolbar, picked up between passes
+  frames = render_progressive(*view, imgWidth, imgHeight, maxIterations, skipUniform = skipUniform)
+  frame = next(frames)
+
+  fig, ax = plt.subplots(figsize = (_IMG_WIDTH, _IMG_HEIGHT), dpi = _DPI)
+  image = ax.imshow(frame.escapeCounts, cmap = _CMAP, origin = 'lower', norm = colors.PowerNorm(0.4), extent = view)
+  def limitsChanged(axes):
+    limits = axes.get_xlim() + axes.get_ylim()
+    if limits != view:
+      moved.append(limits)
+  ax.callbacks.connect('xlim_changed', limitsChanged)
+  ax.callbacks.connect('ylim_changed', limitsChanged)
+
+  while plt.fignum_exists(fig.number):
+    if frame is not None:
+      image.set_data(frame.escapeCounts)
+      image.set_extent(view)
+      image.autoscale()                         # Colour range from this frame, like visualize
+      plt.title(name + '  1/' + str(frame.stride))
+    plt.pause(0.001)                            # Draws, and runs the toolbar callbacks
+    if moved:
+      view = moved[-1]                          # Drop the remaining passes, start over on the new view
+      moved.clear()
+      frame = frames.send(view) if frame is not None else None
+      if frame is None:
+        frames = render_progressive(*view, imgWidth, imgHeight, maxIterations, skipUniform = skipUniform)
+        frame = next(frames)
+    elif frame is not None:
+      frame = next(frames, None)
+    else:
+      plt.pause(0.05)                           # Finished, idle until the view changes
@@ -0,0 +1,275 @@
+'''
+  Zoom animations: a keyframe path rendered as a stream of frames through a three-stage pipeline.
+
+  Keyframes give (frame, centre, scale = view width, maxIterations); zoomPath fills in every frame between them with
+  the scale interpolated geometrically (a steady zoom speed) and the centre moving in proportion to it.
+  render_zoom then runs three stages in their own threads, connected by bounded queues:
+    compute   the nogil prange kernel below, all cores, pixel coordinates from the index (no linspace grids,
+              no complex array)
+    colorize  one np.take through the colormap LUT (mandelbrot_export), in place into an RGB buffer
+    encode    PNG (zlib releases the GIL, so --encoders > 1 compress in parallel), PPM, or raw rgb24 to a stream
+  so frame n is written while n + 1 is colorized and n + 2 computed. Escape count and RGB buffers are allocated once
+  and cycled through the stages; a frame's buffers go back to the pool when the stage after it is done with them.
+
+  reuse = True copies a pixel from the previous frame instead of iterating it when the 2 x 2 previous-frame pixels
+  around it all agree (the uniform-cell bet of mandelbrot8_mariani_silver and mandelbrot_progressive), as long as
+  that value is still valid at this frame's maxIterations. Approximate: a missed filament would be copied on from
+  frame to frame, so every refresh-th frame is computed in full.
+
+    python mandelbrot_zoom.py frames/zoom_%04d.png --frames 240 --width 1280 --height 720 --reuse --compare
+    python mandelbrot_zoom.py - --width 1280 --height 720 | ffmpeg -f rawvideo -pix_fmt rgb24 -s 1280x720 -r 30 -i - zoom.mp4
+'''
+
+import argparse, collections, functools, math, os, queue, sys, threading, time, numpy as np
+from numba import njit, prange
+from mandelbrot3a_numba_better import mandelbrot_numba_better
+from mandelbrot_export import colormapLut, colorize, encodePng
+
+_DEPTH     = 2       # Frames waiting between two stages
+_REFRESH   = 8       # With reuse, every 8th frame is computed in full
+_PNG_LEVEL = 1       # zlib level: animation frames are written once and read once
+_CMAP      = 'hot'
+_NO_PREVIOUS = np.zeros((0, 0), np.int32)
+
+Keyframe = collections.namedtuple('Keyframe', ['frame', 'centerReal', 'centerImag', 'scale', 'maxIterations'])
+View     = collections.namedtuple('View', ['centerReal', 'centerImag', 'scale', 'maxIterations'])
+
+def zoomPath(keyframes):
+  '''A View for every frame from the first keyframe's to the last's.'''
+  views = []
+  for a, b in zip(keyframes, keyframes[1:]):
+    for frame in range(a.frame, b.frame):
+      t = (frame - a.frame) / (b.frame - a.frame)
+      scale = math.exp((1 - t) * math.log(a.scale) + t * math.log(b.scale))
+      # Weight of a: follows the scale, so the centre pans by the same fraction of the view every frame
+      weight = (scale - b.scale) / (a.scale - b.scale) if a.scale != b.scale else 1 - t
+      views.append(View(b.centerReal + weight * (a.centerReal - b.centerReal), b.centerImag + weight * (a.centerImag - b.centerImag),
+                        scale, round(a.maxIterations + t * (b.maxIterations - a.maxIterations))))
+  views.append(View(*keyframes[-1][1:]))
+  return views
+
+def frameBounds(view, width, height):
+  '''(xMin, yMax, step): pixel (j, i) is centred on xMin + (i + 0.5) * step, yMax - (j + 0.5) * step (row 0 at the top).'''
+  step = view.scale / width
+  return (view.centerReal - view.scale / 2, view.centerImag + step * height / 2, step)
+
+@njit(parallel = True, nogil = True, cache = True)
+def mandelbrot_zoom_frame(xMin, yMax, step, maxIterations, output, previous, previousXMin, previousYMax, previousStep, previousIterations):
+  height, width = output.shape
+  previousHeight, previousWidth = previous.shape                 # (0, 0): nothing to reuse
+  reused = np.zeros(height, np.int64)
+  for j in prange(height):
+    cImag = yMax - (j + 0.5) * step
+    j0 = int(np.floor((previousYMax - cImag) / previousStep - 0.5)) if previousHeight > 0 else -1
+    for i in range(width):
+      cReal = xMin + (i + 0.5) * step
+      if j0 >= 0 and j0 + 1 < previousHeight:
+        i0 = int(np.floor((cReal - previousXMin) / previousStep - 0.5))
+        if i0 >= 0 and i0 + 1 < previousWidth:
+          value = previous[j0, i0]
+          # Escaped below maxIterations stays escaped at the same count; 0 (never escaped) only holds for the same maxIterations
+          valid = 0 < value < maxIterations or (value == 0 and maxIterations == previousIterations)
+          if valid and previous[j0, i0 + 1] == value and previous[j0 + 1, i0] == value and previous[j0 + 1, i0 + 1] == value:
+            output[j, i] = value
+            reused[j] += 1
+            continue
+      output[j, i] = mandelbrot_numba_better(cReal, cImag, maxIterations)
+  return reused.sum()
+
+@functools.lru_cache(maxsize = 16)
+def _lut(maxIterations, cmap):
+  return colormapLut(maxIterations, cmap)
+
+def _writeFrame(path, stream, number, rgb, level):
+  if stream is not None:
+    stream.write(rgb.data)                                       # Raw rgb24, in frame order
+  elif path.lower().endswith('.ppm'):
+    with open(path % number, 'wb') as file:
+      file.write(('P6\n' + str(rgb.shape[1]) + ' ' + str(rgb.shape[0]) + '\n255\n').encode())
+      file.write(rgb.data)
+  else:
+    with open(path % number, 'wb') as file:
+      file.write(encodePng(rgb, level))
+
+def render_zoom(views, width, height, path, cmap = _CMAP, reuse = False, refresh = _REFRESH, encoders = 1, level = _PNG_LEVEL, depth = _DEPTH):
+  '''Streams every view to path ('%'-pattern of .png/.ppm files, '-' for stdout, or a binary file object);
+  returns the frame count, wall seconds, fps, busy seconds of each stage and the reused pixel count.'''
+  stream = sys.stdout.buffer if path == '-' else (path if not isinstance(path, str) else None)
+  if stream is not None:
+    encoders = 1                                                 # A stream has to be written in order
+  counts = [np.empty((height, width), np.int32) for _ in range(depth + 3)]  # Computing, held for reuse, queued, colorizing
+  rgbs   = [np.empty((height, width, 3), np.uint8) for _ in range(depth + encoders + 1)]
+  freeCounts, freeRgbs = queue.Queue(), queue.Queue()
+  for k in range(len(counts)):
+    freeCounts.put(k)
+  for k in range(len(rgbs)):
+    freeRgbs.put(k)
+  computed, colored = queue.Queue(depth), queue.Queue(depth)
+  users = [0] * len(counts)                                      # Stages still reading each counts buffer
+  lock = threading.Lock()
+  failed = threading.Event()
+  errors = []
+  busy = collections.Counter()
+
+  def release(k):
+    with lock:
+      users[k] -= 1
+      if users[k] == 0:
+        freeCounts.put(k)
+
+  def get(source):                                               # None once another stage has failed
+    while not failed.is_set():
+      try:
+        return source.get(timeout = 0.1)
+      except queue.Empty:
+        pass
+    return None
+
+  def put(target, item):
+    while not failed.is_set():
+      try:
+        return target.put(item, timeout = 0.1)
+      except queue.Full:
+        pass
+
+  def computeStage():
+    seconds, reusedTotal, previous = 0.0, 0, None
+    for number, view in enumerate(views):
+      k = get(freeCounts)
+      if k is None:
+        break
+      users[k] = 2 if reuse else 1                               # Colorize, and the next frame if it reuses this one
+      start = time.perf_counter()
+      xMin, yMax, step = frameBounds(view, width, height)
+      if previous is not None and number % refresh != 0:
+        previousXMin, previousYMax, previousStep = frameBounds(views[number - 1], width, height)
+        reusedTotal += mandelbrot_zoom_frame(xMin, yMax, step, view.maxIterations, counts[k], counts[previous],
+                                             previousXMin, previousYMax, previousStep, views[number - 1].maxIterations)
+      else:
+        mandelbrot_zoom_frame(xMin, yMax, step, view.maxIterations, counts[k], _NO_PREVIOUS, 0.0, 0.0, 1.0, 0)
+      seconds += time.perf_counter() - start
+      put(computed, (number, k, view.maxIterations))
+      if previous is not None:
+        release(previous)
+      previous = k if reuse else None
+    if previous is not None:
+      release(previous)
+    put(computed, None)
+    with lock:
+      busy['compute'] += seconds
+      busy['reused'] += reusedTotal
+
+  def colorizeStage():
+    seconds = 0.0
+    while True:
+      item = get(computed)
+      if item is None:
+        break
+      number, k, maxIterations = item
+      r = get(freeRgbs)
+      if r is None:
+        break
+      start = time.perf_counter()
+      colorize(counts[k], _lut(maxIterations, cmap), out = rgbs[r])
+      seconds += time.perf_counter() - start
+      release(k)
+      put(colored, (number, r))
+    for _ in range(encoders):
+      put(colored, None)
+    with lock:
+      busy['colorize'] += seconds
+
+  def encodeStage():
+    seconds = 0.0
+    while True:
+      item = get(colored)
+      if item is None:
+        break
+      number, r = item
+      start = time.perf_counter()
+      _writeFrame(path, stream, number, rgbs[r], level)
+      seconds += time.perf_counter() - start
+      freeRgbs.put(r)
+    with lock:
+      busy['encode'] += seconds
+
+  def run(stage):
+    try:
+      stage()
+    except BaseException as error:
+      errors.append(error)
+      failed.set()
+
+  # Launch the parallel kernel from this thread first: Numba's thread pool started from a stage thread hangs interpreter exit
+  mandelbrot_zoom_frame(0.0, 0.0, 1.0, 1, np.empty((2, 2), np.int32), np.zeros((2, 2), np.int32), 0.0, 0.0, 1.0, 1)
+  start = time.perf_counter()
+  threads = [threading.Thread(target = run, args = (stage,)) for stage in [computeStage, colorizeStage] + [encodeStage] * encoders]
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  if errors:
+    raise errors[0]
+  if stream is not None:
+    stream.flush()
+  seconds = time.perf_counter() - start
+  return {'frames': len(views), 'seconds': seconds, 'fps': len(views) / seconds, 'compute': busy['compute'],
+          'colorize': busy['colorize'], 'encode': busy['encode'], 'reused': busy['reused']}
+
+def render_zoom_sequential(views, width, height, path, cmap = _CMAP, level = _PNG_LEVEL, func = None):
+  '''The old way for comparison: one backend call per frame (linspace grids and all), then colorize and write, in turn.'''
+  if func is None:
+    from mandelbrot3a_numba_betterer import mandelbrot_set_numba_betterer
+    func = functools.partial(mandelbrot_set_numba_betterer, precision = np.float64)
+  start = time.perf_counter()
+  for number, view in enumerate(views):
+    xMin, yMax, step = frameBounds(view, width, height)
+    escapeCounts = func(xMin, xMin + step * (width - 1), yMax - step * (height - 1), yMax, width, height, view.maxIterations)[2][::-1]
+    _writeFrame(path, None, number, colorize(escapeCounts, _lut(view.maxIterations, cmap)), level)
+  seconds = time.perf_counter() - start
+  return {'frames': len(views), 'seconds': seconds, 'fps': len(views) / seconds}
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description = 'Render a Mandelbrot zoom animation as frames')
+  parser.add_argument('path',               help = "frame pattern like frames/zoom_%%04d.png (or .ppm), or - for raw rgb24 on stdout")
+  parser.add_argument('--frames',           type = int,   default = 120)
+  parser.add_argument('--width',            type = int,   default = 640)
+  parser.add_argument('--height',           type = int,   default = 360)
+  parser.add_argument('--center',           type = float, nargs = 2, default = [-0.743643887037151, 0.131825904205330], metavar = ('REAL', 'IMAG'))
+  parser.add_argument('--scales',           type = float, nargs = 2, default = [3.0, 3e-5], metavar = ('START', 'END'), help = 'view width')
+  parser.add_argument('--iterations',       type = int,   nargs = 2, default = [100, 1000], metavar = ('START', 'END'))
+  parser.add_argument('--start-center',     type = float, nargs = 2, default = [-0.75, 0.0], metavar = ('REAL', 'IMAG'))
+  parser.add_argument('--reuse',            action = 'store_true', help = "copy uniform regions from the previous frame (approximate)")
+  parser.add_argument('--refresh',          type = int,   default = _REFRESH, help = 'with --reuse, compute every Nth frame in full')
+  parser.add_argument('--encoders',         type = int,   default = 1, help = 'PNG encoder threads')
+  parser.add_argument('--level',            type = int,   default = _PNG_LEVEL)
+  parser.add_argument('--cmap',             default = _CMAP)
+  parser.add_argument('--compare',          action = 'store_true', help = 'also time the sequential per-frame loop (and check --reuse)')
+  args = parser.parse_args()
+
+  views = zoomPath([Keyframe(0, *args.start_center, args.scales[0], args.iterations[0]),
+                    Keyframe(args.frames - 1, *args.center, args.scales[1], args.iterations[1])])
+  if args.path != '-' and os.path.dirname(args.path):
+    os.makedirs(os.path.dirname(args.path), exist_ok = True)
+  report = sys.stderr if args.path == '-' else sys.stdout                               # Keep stdout for the frames
+
+  result = render_zoom(views, args.width, args.height, args.path, args.cmap, args.reuse, args.refresh, args.encoders, args.level)
+  print('pipeline    %d frames %dx%d  %.2fs  %.2f fps   busy: compute %.2fs colorize %.2fs encode %.2fs   reused %.1f%% of pixels'
+        % (result['frames'], args.width, args.height, result['seconds'], result['fps'], result['compute'], result['colorize'],
+           result['encode'], 100 * result['reused'] / (result['frames'] * args.width * args.height)), file = report)
+
+  if args.compare and args.path != '-':
+    sequential = render_zoom_sequential(views, args.width, args.height, args.path, args.cmap, args.level)
+    print('sequential  %d frames  %.2fs  %.2f fps   pipeline is %.2fx faster'
+          % (sequential['frames'], sequential['seconds'], sequential['fps'], sequential['seconds'] / result['seconds']), file = report)
+    # How far --reuse drifts from a full render over one refresh period
+    full, chained = np.empty((args.height, args.width), np.int32), np.empty((args.height, args.width), np.int32)
+    last = min(args.refresh, len(views)) - 1
+    mandelbrot_zoom_frame(*frameBounds(views[0], args.width, args.height), views[0].maxIterations, chained, _NO_PREVIOUS, 0.0, 0.0, 1.0, 0)
+    for number in range(1, last + 1):
+      mandelbrot_zoom_frame(*frameBounds(views[number], args.width, args.height), views[number].maxIterations, chained, chained.copy(),
+                            *frameBounds(views[number - 1], args.width, args.height), views[number - 1].maxIterations)
+    mandelbrot_zoom_frame(*frameBounds(views[last], args.width, args.height), views[last].maxIterations, full, _NO_PREVIOUS, 0.0, 0.0, 1.0, 0)
+    wrong = np.count_nonzero(full != chained)
+    print('reuse check: after %d chained frames %d of %d pixels (%.3f%%) differ from a full render'
+          % (last, wrong, full.size, 100 * wrong / full.size), file = report)
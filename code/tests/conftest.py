@@ -0,0 +1,4 @@
+import os, sys
+
+# The backends import each other as top-level modules, the way they are run from code/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
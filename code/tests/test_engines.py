@@ -0,0 +1,18 @@
+import itertools, pytest
+import engines
+
+_VIEW = (-2.0, 0.5, -1.2, 1.2, 37, 23, 64)  # Non-square, odd sizes: a transposed or padded result can't pass
+
+# 'mpi' runs under mpirun; importing mpi4py after Numba's TBB pool has started also deadlocks Open MPI at exit
+_NAMES = [name for name in engines.names() if name != 'mpi']
+
+@pytest.mark.parametrize('name', _NAMES)
+def test_result_contract(name):
+  if not engines.load(name):
+    pytest.skip(engines.unavailable()[name])
+  engine = engines.get(name)
+  if engine.precisions == (engine.dtype,) and engine.outputs == (engines.OUTPUT_COUNTS,):
+    engines.checkResult(engine.func(*_VIEW), _VIEW[4], _VIEW[5])
+  else:
+    for precision, output in itertools.product(engine.precisions, engine.outputs):
+      engines.checkResult(engine.func(*_VIEW, precision = precision, output = output), _VIEW[4], _VIEW[5], output)
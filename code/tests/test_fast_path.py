@@ -0,0 +1,28 @@
+import numpy as np, pytest
+from mandelbrot3a_numba_better import mandelbrot_set_numba_better
+from mandelbrot3a_numba_betterer import mandelbrot_set_numba_betterer
+
+# The opt-in interior fast path (cardioid/bulb tests, periodicity checking) must not change a single pixel
+_VIEWS = {
+  'full set':       (-2.0, 0.5, -1.25, 1.25, 300, 300, 2048),
+  'deep zoom':      (-0.74877, -0.74872, 0.06505, 0.06510, 300, 300, 2048),   # Seahorse valley boundary
+  'cardioid, bulb': (-1.3, 0.4, -0.7, 0.7, 300, 300, 2048),                  # Mostly inside the main cardioid and period-2 bulb
+}
+
+@pytest.mark.parametrize('view', _VIEWS.values(), ids = list(_VIEWS))
+def test_numba_better_fast(view):
+  assert np.array_equal(mandelbrot_set_numba_better(*view)[2], mandelbrot_set_numba_better(*view, True)[2])
+
+@pytest.mark.parametrize('precision', [np.float32, np.float64])
+@pytest.mark.parametrize('view', _VIEWS.values(), ids = list(_VIEWS))
+def test_numba_betterer_fast(view, precision):
+  plain = mandelbrot_set_numba_betterer(*view, precision = precision)[2]
+  assert np.array_equal(plain, mandelbrot_set_numba_betterer(*view, True, precision = precision)[2])
+
+@pytest.mark.parametrize('precision', [np.float32, np.float64])
+@pytest.mark.parametrize('view', _VIEWS.values(), ids = list(_VIEWS))
+def test_cython_fast(view, precision):
+  pytest.importorskip('c_mandelbrot', reason = 'Cython extension not built (python setup.py build_ext --inplace)')
+  from mandelbrot5_cython import mandelbrot_set_cython
+  plain = mandelbrot_set_cython(*view, precision = precision)[2]
+  assert np.array_equal(plain, mandelbrot_set_cython(*view, True, precision = precision)[2])
@@ -0,0 +1,20 @@
+import numpy as np
+import engines
+from mandelbrot1_purepython import mandelbrot_set_purepython
+from mandelbrot3a_numba_better import mandelbrot_set_numba_better
+
+def test_escaped_at_zero_is_not_interior():
+  # |c| > 2 comes back as 0 from the interior-zero kernels, like the interior does: it ran 1 iteration, not maxIterations
+  view = (-2.0, 0.5, -1.25, 1.25, 400, 400, 256)
+  result = mandelbrot_set_numba_better(*view)
+  realNums, imagNums, escapeCounts = result
+  outside = imagNums[:, None] ** 2 + realNums[None, :] ** 2 > 4.0
+  capped = (escapeCounts == 0) & ~outside
+  expected = int(escapeCounts[~capped].sum(dtype = np.int64)) + int((~capped).sum()) + int(capped.sum()) * 256
+  assert engines.frameWork(engines.get('numba_better'), result, 256) == (int((~capped).sum()), int(capped.sum()), expected)
+
+def test_interior_zero_and_interior_max_engines_agree():
+  view = (-2.0, 0.5, -1.25, 1.25, 40, 40, 64)
+  plain = engines.frameWork(engines.get('numba_better'), mandelbrot_set_numba_better(*view), 64)
+  pure = engines.frameWork(engines.get('purepython'), mandelbrot_set_purepython(*view), 64)
+  assert plain[:2] == pure[:2]
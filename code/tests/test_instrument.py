@@ -0,0 +1,22 @@
+import numpy as np, pytest
+import engines, instrument
+from mandelbrot3c_numba_simd import clockNow
+
+_VIEW = (-2.0, 0.5, -1.2, 1.2, 64, 48, 80)
+
+@pytest.fixture
+def enabled():
+  instrument.enable(memory = False)
+  yield
+  instrument.disable()
+
+@pytest.mark.skipif(clockNow is None, reason = 'no clock_gettime for per-row timings')
+@pytest.mark.parametrize('mode', [{}, {'fast': True}, {'output': 'smooth'}, {'precision': np.float64}])
+def test_numba_betterer_reports_a_chunk_per_row(enabled, mode):
+  engine = engines.get('numba_betterer')
+  escapeCounts = engine.func(*_VIEW, **mode)[2]
+  record = instrument.records[-1]
+  assert sum(thread['chunks'] for thread in record['threads']) == _VIEW[5]
+  assert all(thread['busy'] > 0 for thread in record['threads'])
+  instrument.disable()
+  assert np.array_equal(escapeCounts, engines.get('numba_betterer').func(*_VIEW, **mode)[2])  # Same pixels as the gufuncs
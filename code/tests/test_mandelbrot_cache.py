@@ -0,0 +1,61 @@
+import glob, os, numpy as np, pytest
+import mandelbrot_cache
+from mandelbrot_cache import latticeView, mandelbrot_set_cached, render_cached, stats
+from mandelbrot3a_numba_better import mandelbrot_set_numba_better
+
+_VIEW = (-0.74877, -0.74872, 0.06505, 0.06510, 300, 300)             # Not on the lattice
+_STEP = 2.0 ** -22
+_LATTICE = latticeView(-0.748745, 0.065075, 300, 200, 22) + (300, 200)
+
+@pytest.fixture(autouse = True)
+def cache(tmp_path):
+  mandelbrot_cache.configure(directory = str(tmp_path))
+  mandelbrot_cache.clearMemory()
+  stats.clear()
+  yield tmp_path
+  mandelbrot_cache.clearMemory()
+
+def _panned(view, pixels):
+  return (view[0] + pixels * _STEP, view[1] + pixels * _STEP) + view[2:]
+
+@pytest.mark.parametrize('view', [_VIEW, (-2.0, 0.5, -1.2, 1.2, 333, 250), _LATTICE], ids = ['deep zoom', 'full set', 'lattice'])
+def test_cached_engine_is_exactly_numba_better(view):
+  for _ in range(2):                                                  # Computed, then from memory
+    cached = mandelbrot_set_cached(*view, 256)
+    plain = mandelbrot_set_numba_better(*view, 256)
+    for ours, theirs in zip(cached, plain):
+      assert np.array_equal(ours, theirs)
+  assert stats['memory hits'] > 0
+
+def test_pan_by_a_fraction_of_a_tile_hits():
+  render_cached('numba_better', *_LATTICE, 256)
+  computed = stats['computed']
+  panned = _panned(_LATTICE, 77)
+  escapeCounts = render_cached('numba_better', *panned, 256)[2]
+  assert stats['memory hits'] > 0
+  assert np.array_equal(escapeCounts, mandelbrot_set_numba_better(*panned, 256)[2])
+  mandelbrot_cache.clearMemory()
+  render_cached('numba_better', *panned, 256)
+  assert stats['disk hits'] > 0 and stats['computed'] - computed < computed  # At most the new column of tiles was computed
+
+def test_resume_is_bit_identical_and_keeps_only_the_deepest_state(cache):
+  render_cached('numba_better', *_VIEW, 256)
+  resumed = render_cached('numba_better', *_VIEW, 1024)[2]
+  assert stats['resumed'] > 0
+  assert not glob.glob(os.path.join(str(cache), '*_256.state.npz'))
+  assert np.array_equal(resumed, mandelbrot_set_numba_better(*_VIEW, 1024)[2])
+
+def test_state_without_counts_is_recomputed(cache):
+  render_cached('numba_better', *_VIEW, 256)
+  for path in glob.glob(os.path.join(str(cache), '*_256.npy')):
+    os.remove(path)
+  mandelbrot_cache.clearMemory()
+  stats.clear()
+  render_cached('numba_better', *_VIEW, 512)
+  assert stats['resumed'] == 0 and stats['computed'] > 0
+
+@pytest.mark.parametrize('mode', [{'precision': np.float32}, {'output': 'smooth'}, {'output': 'bogus'}])
+def test_unsupported_mode_is_rejected(cache, mode):
+  with pytest.raises(ValueError):
+    mandelbrot_cache.cachedTile('numba_better', -2.0, 0.5, -1.25, 1.25, 16, 16, 64, **mode)
+  assert not os.listdir(str(cache))
@@ -0,0 +1,12 @@
+import concurrent.futures, numpy as np
+from mandelbrot3a_numba_better import mandelbrot_set_numba_better
+from mandelbrot6_multiprocessing import mandelbrot_set_multiprocessing
+
+def test_concurrent_calls_do_not_share_rows():
+  views = [(-2.0, 0.5, -1.2, 1.2, 200, 150, 80), (-0.74877, -0.74872, 0.06505, 0.06510, 150, 200, 512)]
+  expected = [mandelbrot_set_numba_better(*view)[2] for view in views]
+  with concurrent.futures.ThreadPoolExecutor(2) as executor:
+    for _ in range(3):
+      results = list(executor.map(lambda view: mandelbrot_set_multiprocessing(*view)[2], views))
+      for result, want in zip(results, expected):
+        assert np.array_equal(result, want)
@@ -5,37 +5,40 @@
 
 import time, functools
 
+# Display name -> engine name (see engines.py)
 funcs = {
-  'Pure Python:'     : 'mandelbrot_set_purepython',
-  'Numpy:   '        : 'mandelbrot_set_numpy',
-  'Better Numpy:'    : 'mandelbrot_set_numpy_better',
-  'Numba:   '        : 'mandelbrot_set_numba',
-  'Better Numba:'    : 'mandelbrot_set_numba_better',
-  'Betterer Numba:'  : 'mandelbrot_set_numba_betterer',
-  'Numexpr:   '      : 'mandelbrot_set_numexpr',
-  'Cython:   '       : 'mandelbrot_set_cython'
+  'Pure Python:'     : 'purepython',
+  'Numpy:   '        : 'numpy',
+  'Better Numpy:'    : 'numpy_better',
+  'Compact Numpy:'   : 'numpy_compact',
+  'Numba:   '        : 'numba',
+  'Better Numba:'    : 'numba_better',
+  'Betterer Numba:'  : 'numba_betterer',
+  'SIMD Numba:'      : 'numba_simd',
+  'Numexpr:   '      : 'numexpr',
+  'Cython:   '       : 'cython',
+  'Multiprocessing:' : 'multiprocessing'
 }
 
 '''
 # This is for testing in my written report
 # Cython and the three Numbas do so well they can't be seen on the chart... so, let's just do those four!
 funcs = {
-  'Numba:   '        : 'mandelbrot_set_numba',
-  'Better Numba:'    : 'mandelbrot_set_numba_better',
-  'Betterer Numba:'  : 'mandelbrot_set_numba_betterer',
-  'Cython:   '       : 'mandelbrot_set_cython'
+  'Numba:   '        : 'numba',
+  'Better Numba:'    : 'numba_better',
+  'Betterer Numba:'  : 'numba_betterer',
+  'Cython:   '       : 'cython'
 }
 '''
 '''
 # Betterer Numba is so fast, let's test it on its own
 funcs = {
-  'Betterer Numba:'  : 'mandelbrot_set_numba_betterer',
+  'Betterer Numba:'  : 'numba_betterer',
 }
 '''
 
-# Multiprocessing and MPI can't be done normally because they each spawn processes
-# Repeat runs of timed() means more and more processes... the output gets messy
-# So, we just run these two normally
+# Multiprocessing keeps one persistent pool, so it is timed like everything else
+# MPI can't be: every rank has to call it, so it is run under mpirun on its own (see mandelbrot7_mpi.py)
 
 ################
 # Timer function